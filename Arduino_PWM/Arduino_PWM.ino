@@ -30,6 +30,26 @@ char packetBuffer[UDP_TX_PACKET_MAX_SIZE];  // buffer to hold incoming packet,
 //char replyBuffer[] = "acknowledged";        // a string to send back
 //char replyBuffer1[] = "acknowledged";        // a string to send back
 char reply[50];
+char seqPrefix[8]; // Optional "#<seq>:" prefix of the current packet, echoed back on the reply
+
+//Sequence numbers of the last few updates applied. A retransmitted update (reliable_updates on the client)
+//whose first copy was applied is acknowledged again but not re-applied.
+#define RECENT_UPDATES 8
+long recentUpdateSeqs[RECENT_UPDATES] = {-1, -1, -1, -1, -1, -1, -1, -1};
+uint8_t recentUpdateIndex = 0;
+
+//Binary wire format (see PWM_Protocol.py): opcode | seq (2 bytes) | count | count x [pin | duty]
+#define BINARY_OPCODE_MIN  0x80
+#define OP_PING            0x81
+#define OP_PING_TEST       0x82
+#define OP_REQUEST_CONFIG  0x83
+#define OP_UPDATE          0x84
+#define OP_ACK             0xC1
+#define OP_ACK_TEST        0xC2
+#define OP_CONFIG          0xC3
+#define OP_UPDATED         0xC4
+#define BINARY_HEADER_SIZE 4
+uint8_t binaryReply[BINARY_HEADER_SIZE + 2*4];
 
 //Arduino PWM pins and values
 #define pin0 3
@@ -113,24 +133,32 @@ void loop() {
 
         // read the packet into packetBufffer
         Udp.read(packetBuffer, UDP_TX_PACKET_MAX_SIZE);
+        if((uint8_t)packetBuffer[0] >= BINARY_OPCODE_MIN) {
+            //Binary frame, handled and replied to separately from the text commands below
+            handleBinaryPacket((uint8_t *)packetBuffer, packetSize);
+            for(int i=0; i<UDP_TX_PACKET_MAX_SIZE; i++) packetBuffer[i] = 0; //Clears packetBuffer
+            return;
+        }
         Serial.println("Contents:");
         Serial.println(packetBuffer);
+        //Strip the optional sequence number so the commands below see the bare message
+        char *command = stripSequence(packetBuffer, seqPrefix);
         //UDP packet handling:
         //uint8_t pwmPin;
         //uint8_t dutyCycle;
-        if(strcmp(packetBuffer, "!PING") == 0) { //if strings are equal
+        if(strcmp(command, "!PING") == 0) { //if strings are equal
             Serial.println("!PING acknowledged");
             memset(reply, '\0', sizeof(reply)); //Set null-terminating chars in all positions of the char array
             strcpy(reply, "acknowledged");
             Serial.println(reply);
         }
-        else if(strcmp(packetBuffer, "!PING_test") == 0) { //if strings are equal
+        else if(strcmp(command, "!PING_test") == 0) { //if strings are equal
             Serial.println("!PING acknowledged");
             memset(reply, '\0', sizeof(reply)); //Set null-terminating chars in all positions of the char array
             strcpy(reply, "acknowledged_test");
             Serial.println(reply);
         }
-        else if(strcmp(packetBuffer, "!REQUEST_CONFIG") == 0) { //if strings are equal
+        else if(strcmp(command, "!REQUEST_CONFIG") == 0) { //if strings are equal
             Serial.println("!REQUEST_CONFIG acknowledged");
             memset(reply, '\0', sizeof(reply)); //Set null-terminating chars in all positions of the char array
             char* configs;
@@ -146,7 +174,15 @@ void loop() {
             //memset(replyBuffer, '\0', sizeof(replyBuffer)); //Set null-terminating chars in all positions of the char array
             //strcpy(replyBuffer, "Done nothing.");
             //extractString(packetBuffer);
-            updatePWM(packetBuffer, &dutyCycle0, &dutyCycle1, &dutyCycle2, &dutyCycle3);
+            if(seqPrefix[0] == '#' && isDuplicateUpdate(atol(seqPrefix + 1))) {
+                Serial.println("Duplicate update, acknowledged without applying.");
+            }
+            else {
+                updatePWM(command, &dutyCycle0, &dutyCycle1, &dutyCycle2, &dutyCycle3);
+            }
+            //Reply with a fixed string rather than whatever was left in reply from the last command
+            memset(reply, '\0', sizeof(reply));
+            strcpy(reply, "updated");
             Serial.println(dutyCycle0);
             Serial.println(dutyCycle1);
             Serial.println(dutyCycle2);
@@ -157,6 +193,7 @@ void loop() {
     
         // send a reply to the IP address and port that sent us the packet we received
         Udp.beginPacket(Udp.remoteIP(), Udp.remotePort());
+        Udp.write(seqPrefix);
         Udp.write(reply);
         Udp.endPacket();
         //for(int i=0; i<50; i++) reply[i] = 0; //Clears replyBuffer
@@ -211,12 +248,115 @@ char * printCurrentConfig(uint8_t dutyCycle0, uint8_t dutyCycle1, uint8_t dutyCy
     strcat(configString, p_pin3);
     strcat(configString, "_");
     strcat(configString, p_dutyCycle3);
+    strcat(configString, "|BIN"); //Capability: this firmware also understands the binary format
     
     return configString;
 }
 
 ////Server functions////
+void setDutyCycle(uint8_t pinNo, uint8_t dutyCycle, int *dutyCycle0, int *dutyCycle1, int *dutyCycle2, int *dutyCycle3 ) {
+    //Update PWM values:
+    uint8_t dutyVal = map(dutyCycle, 0, 100, 0, 255);
+    if(pinNo == pin0) {
+        analogWrite(pinNo, dutyVal);
+        *dutyCycle0 = dutyCycle;
+    }
+    else if(pinNo == pin1) {
+        analogWrite(pinNo, dutyVal);
+        *dutyCycle1 = dutyCycle;
+    }
+    else if(pinNo == pin2) {
+        analogWrite(pinNo, dutyVal);
+        *dutyCycle2 = dutyCycle;
+    }
+    else if(pinNo == pin3) {
+        analogWrite(pinNo, dutyVal);
+        *dutyCycle3 = dutyCycle;
+    }
+    else Serial.println("Error in updating PWM"); //you need to notify the user the wrong config has been setup
+}
+
+void handleBinaryPacket(uint8_t *packet, int packetSize) {
+    //Binary counterpart of the text commands in loop(). The reply echoes the sequence number.
+    if(packetSize < BINARY_HEADER_SIZE) {
+        Serial.println("Binary frame too short.");
+        return;
+    }
+    uint8_t opcode = packet[0];
+    uint8_t count  = packet[3];
+    uint8_t replyLength = BINARY_HEADER_SIZE;
+    binaryReply[1] = packet[1]; //seq, high byte
+    binaryReply[2] = packet[2]; //seq, low byte
+    binaryReply[3] = 0;
+    if(opcode == OP_PING) {
+        binaryReply[0] = OP_ACK;
+    }
+    else if(opcode == OP_PING_TEST) {
+        binaryReply[0] = OP_ACK_TEST;
+    }
+    else if(opcode == OP_REQUEST_CONFIG) {
+        binaryReply[0] = OP_CONFIG;
+        binaryReply[3] = 4;
+        binaryReply[4]  = pin0; binaryReply[5]  = dutyCycle0;
+        binaryReply[6]  = pin1; binaryReply[7]  = dutyCycle1;
+        binaryReply[8]  = pin2; binaryReply[9]  = dutyCycle2;
+        binaryReply[10] = pin3; binaryReply[11] = dutyCycle3;
+        replyLength += 2*4;
+    }
+    else if(opcode == OP_UPDATE) {
+        long seq = ((long)packet[1] << 8) | packet[2]; //0 means the frame is not sequenced
+        if(seq != 0 && isDuplicateUpdate(seq)) count = 0; //Already applied, only acknowledge
+        for(int i=0; i<count && BINARY_HEADER_SIZE + 2*i + 1 < packetSize; i++) {
+            setDutyCycle(packet[BINARY_HEADER_SIZE + 2*i], packet[BINARY_HEADER_SIZE + 2*i + 1],
+                &dutyCycle0, &dutyCycle1, &dutyCycle2, &dutyCycle3);
+        }
+        binaryReply[0] = OP_UPDATED;
+    }
+    else {
+        Serial.println("Unknown binary opcode.");
+        return;
+    }
+    Udp.beginPacket(Udp.remoteIP(), Udp.remotePort());
+    Udp.write(binaryReply, replyLength);
+    Udp.endPacket();
+}
+
 void updatePWM(char arr[256], int *dutyCycle0, int *dutyCycle1, int *dutyCycle2, int *dutyCycle3 ) {
+    //A message may hold several updates separated by '|', eg. "3_50|5_20|6_0|9_100".
+    //All of them are applied before the single reply is sent.
+    char *entry = strtok(arr, "|");
+    if(entry == NULL) {
+        Serial.println("Message does not follow the specified format.");
+        return;
+    }
+    while(entry != NULL) {
+        updateSinglePWM(entry, dutyCycle0, dutyCycle1, dutyCycle2, dutyCycle3);
+        entry = strtok(NULL, "|");
+    }
+}
+
+bool isDuplicateUpdate(long seq) {
+    //Returns true if an update with this sequence number was applied recently, otherwise records it
+    for(int i=0; i<RECENT_UPDATES; i++) {
+        if(recentUpdateSeqs[i] == seq) return true;
+    }
+    recentUpdateSeqs[recentUpdateIndex] = seq;
+    recentUpdateIndex = (recentUpdateIndex + 1) % RECENT_UPDATES;
+    return false;
+}
+
+char * stripSequence(char *packet, char *prefix) {
+    //Messages may start with "#<seq>:" (eg. "#17:3_50"). Copies the prefix into prefix so
+    //it can be echoed on the reply and returns a pointer to the command after it.
+    memset(prefix, '\0', 8);
+    if(packet[0] != '#') return packet;
+    char *separator = strchr(packet, ':');
+    if(separator == NULL || (separator - packet) > 6) return packet; //"#65535:" is the longest prefix
+    strncpy(prefix, packet, separator - packet + 1);
+    return separator + 1;
+}
+
+void updateSinglePWM(char *arr, int *dutyCycle0, int *dutyCycle1, int *dutyCycle2, int *dutyCycle3 ) {
     char *idPosition; //Used to locate the substring "_"
     char *dutyCPos;
 
@@ -230,25 +370,7 @@ void updatePWM(char arr[256], int *dutyCycle0, int *dutyCycle1, int *dutyCycle2,
         uint8_t dutyCycle = atoi(dutyCPos+1); //Extract the duty cycle value
         Serial.println(pinNo);
         Serial.println(dutyCycle);
-        //Update PWM values:
-        uint8_t dutyVal = map(dutyCycle, 0, 100, 0, 255);
-        if(pinNo == pin0) {
-            analogWrite(pinNo, dutyVal);
-            *dutyCycle0 = dutyCycle;
-        }
-        else if(pinNo == pin1) {
-            analogWrite(pinNo, dutyVal);
-            *dutyCycle1 = dutyCycle;
-        }
-        else if(pinNo == pin2) {
-            analogWrite(pinNo, dutyVal);
-            *dutyCycle2 = dutyCycle;
-        }
-        else if(pinNo == pin3) {
-            analogWrite(pinNo, dutyVal);
-            *dutyCycle3 = dutyCycle;
-        }
-        else Serial.println("Error in updating PWM"); //you need to notify the user the wrong config has been setup
+        setDutyCycle(pinNo, dutyCycle, dutyCycle0, dutyCycle1, dutyCycle2, dutyCycle3);
     }
     else {
         //Not found:
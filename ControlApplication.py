@@ -26,14 +26,21 @@
 #############################################################
 #endregion
 
-import os
 from os import read
 import socket
 from tkinter import *
 from tkinter import ttk
-import sys
 import time
 import threading
+from PWM_Transport import udp_transport, reply_equals, reply_config, tk_when_done
+from PWM_Protocol import build_update, build_update_many, parse_config_reply
+from PWM_UIQueue import ui_update_queue
+from PWM_Metrics import metrics, configure_metrics
+from PWM_Logging import setup_logging
+from PWM_Config import get_settings
+from PWM_Persistence import settings_writer
+from PWM_Themes import theme_loader
+from PWM_Shadow import shadow_state
 
 # Constants
 HEADER = 64         # Header of 64 bytes to hold the number of bites to be received by the client. Change this accordingly.
@@ -50,8 +57,8 @@ debugging = FALSE  #To be removed, was just for testing. Just meant to disable n
 
 
 # Networking
-client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) #SOCK_STREAM indicates a TCP socket. For udp, use SOCK_DGRAM
-client.settimeout(2) #Sets a 2 second timeout to prevent program hanging if message is not sent. 
+UI_UPDATES = metrics.counter("pwm_ui_updates_total", "update_PWM calls from the UI")
+transport = udp_transport(timeout=2) #Owns the UDP socket. Replies are matched to their request, 2 second timeout per request.
 
 # Tkinter setup
 root = Tk() # Create root window object
@@ -64,7 +71,10 @@ y_pos = int((screen_height/2) - (HEIGHT/2))
 root.geometry(f"{WIDTH}x{HEIGHT}+{x_pos}+{y_pos}") # width x height + XPOS + YPOS
 style = ttk.Style(root) # Create an instance of ttk Style class
 FILENAME="config.txt" # To store configuration data for when the program is restarted
+config_writer = settings_writer(FILENAME) # Saves changed settings atomically, off the Tk thread
 connection_update_mess = StringVar()
+ui_queue = ui_update_queue(root) # The ping thread posts its label updates here, the Tk thread applies them
+shadow = shadow_state() # Commanded and confirmed duty cycles of the device, see PWM_Shadow
 
 def main_window_setup(): # Sets up the main window configuration
     generalPadx = 2
@@ -76,6 +86,7 @@ def main_window_setup(): # Sets up the main window configuration
     entryWidth = 10  #Increase this increases Entry widget size
 
 
+    ui_queue.start()
     ping_thread = threading.Thread(target=ping_timer_thread, daemon=TRUE)
     ping_thread.start()
 
@@ -146,9 +157,10 @@ def main_window_setup(): # Sets up the main window configuration
 
     # Theme combobox, using ttk
     theme_label = ttk.Label(root, text='Theme select:', font = "Sans 12 bold")
-    theme_combobox = ttk.Combobox(root, textvariable=app_theme, font = "Sans 12")
+    theme_combobox = ttk.Combobox(root, textvariable=app_theme, font = "Sans 12",
+        postcommand=lambda: theme_combobox.configure(values=themes.theme_names()))
     theme_combobox.bind('<<ComboboxSelected>>', lambda command: change_theme(app_theme.get()))
-    theme_combobox['values'] = style.theme_names() #Store the themes as a list
+    theme_combobox['values'] = themes.theme_names() #Store the themes as a list, bundled ones load when selected
 
     # Ping/test connectivity:
     ping_label = ttk.Label(root, text='Ping Device:', font = "Sans 12 bold")
@@ -213,37 +225,21 @@ def main_window_setup(): # Sets up the main window configuration
 def read_config():
     global ip_address
     global port
-    lines=[]
+    settings = get_settings() # Parsed once by PWM_Config, shared with PWM_Control_UI
+    ip_address = settings.ip
+    port = settings.port
+    transport.use_sequence = settings.sequence_ids #Tag messages with #<seq>: so replies are routed by ID
+    theme_saved = settings.theme
     try:
-        with open(FILENAME, "r") as f:
-            lines=f.read().splitlines()
-            #print(lines)
-            for i in range(len(lines)):
-                #PWM pin select configuration:
-                #if lines[i].find('pwmPin') != -1: #if the config setting is a pwmPin configuration
-                #    pinNumber = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                #    pins.append(int(pinNumber)) # Append the pin to the pin list
-                if lines[i].find("ip") != -1: #If the ip config is found
-                    ip_address = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    ip_address = str(ip_address)
-                elif lines[i].find("port") != -1: #If the ip config is found
-                    port = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    port = int(port)
-                elif lines[i].find("theme") != -1: #If the theme config is found
-                    theme_saved = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    try:
-                        #print(theme_saved)
-                        style.theme_use(theme_saved)
-                        set_background_colour(theme_saved)
-                    except:
-                        print("[CONSOLE] Error: problem loading theme, defaulting to vista")
-                        editted_setting = edit_file("config.txt", "theme=", 'vista')
-                        set_background_colour('vista')
-        f.close()
-        return [ip_address, port, theme_saved]
-    except Exception as e:
-        print("Error:"+str(e))
-        sys.exit(1)
+        #print(theme_saved)
+        themes.use(theme_saved) # Sources only the saved theme
+        set_background_colour(theme_saved)
+    except:
+        print("[CONSOLE] Error: problem loading theme, defaulting to vista")
+        config_writer.set("theme", 'vista')
+        set_background_colour('vista')
+    configure_metrics(settings.metrics_port, settings.metrics_json)
+    return [ip_address, port, theme_saved]
 
 def update_config(option, value):
     #lines=[]
@@ -259,45 +255,17 @@ def update_config(option, value):
     #    f.close()
     pass
 
-def edit_file(filename, setting_key, setting_value):
-    #Setting key explicit format: SETTING_NAME=
-    lines = []
-    new_lines = []
-    setting_edited=False
-    with open(filename, 'r') as f:
-	    lines = f.readlines() #Store lines in a list
-	    #Find the line to edit 
-    f.close()
-    for i in range(len(lines)):
-        if lines[i].find(setting_key) != -1: #Setting found
-            new_line = lines[i][0:lines[i].find('=')+1] + setting_value #append the new setting
-            new_lines.append(new_line)
-            setting_edited = True
-        else:
-            new_lines.append(lines[i])
-
-    if setting_edited == True:
-        with open(filename, 'w') as f:
-	    #for i in range(0, len(new_lines))
-	    #    f.write(new_lines[i]+'\n')
-	        f.writelines(new_lines)
-    else:
-	    pass
-    return setting_edited
-
 def change_theme(theme_name): # Function to change the current application theme
     #Dark themes:
     dark_themes = ['awdark']
     #Change the theme
-    style.theme_use(theme_name)
-    editted_setting = edit_file("config.txt", "theme=", theme_name)
-    if editted_setting: 
-        print("[CONSOLE]: Config setting was successfully changed.")
-        set_background_colour(theme_name)
-    else:
-        print("[CONSOLE]: Config setting change was unsuccessful.")
+    themes.use(theme_name) # A bundled theme is loaded here the first time it is picked
+    set_background_colour(theme_name)
+    config_writer.set("theme", theme_name) # Saved in the background, see PWM_Persistence
+    print("[CONSOLE]: Config setting will be saved.")
 
 def main():
+    setup_logging() # The shared PWM_ modules log instead of printing
     print("Welcome to the PWM Controller application. Please ensure the device is setup, powered and connected.")
     print("Please note: adjust the IP address of the device to connect to in the config.txt")
     load_awthemes() #Load the custom and native ttk themes for the application
@@ -306,31 +274,12 @@ def main():
     root.mainloop() # Starts tkinter application in an event listening loop, opens main_window
 
 def cleanup():
-    pass
+    config_writer.flush() # Settings changed just before the window was closed
 
 def load_awthemes():
-    # tell tcl where to find the awthemes packages
-    current_directory = os.getcwd()
-    current_directory = current_directory.replace("\\", "/")
-    current_directory = current_directory[current_directory.find(':')+1:len(current_directory)]
-    print(current_directory)
-
-    root.tk.eval("""
-    set dir {/My Projects/PWM_ethernet_controller/awthemes-10.4.0/}
-
-    package ifneeded awthemes 10.4.0 \
-        [list source [file join $dir awthemes.tcl]]
-    package ifneeded colorutils 4.8 \
-        [list source [file join $dir colorutils.tcl]]
-    package ifneeded awdark 7.12 \
-        [list source [file join $dir awdark.tcl]]
-    package ifneeded awlight 7.10 \
-        [list source [file join $dir awlight.tcl]]
-    """)
-    # load the awdark and awlight themes
-    root.tk.call("package", "require", 'awdark')
-    root.tk.call("package", "require", 'awlight')
-    #print(style.theme_names())
+    # tell tcl where to find the awthemes packages, next to this file. Nothing is sourced until a theme is used.
+    global themes
+    themes = theme_loader(root)
 
 def set_background_colour(theme_name):
     if theme_name == 'awdark':
@@ -354,22 +303,6 @@ def set_background_colour(theme_name):
     else: 
         pass
         
-def string_splicer(search_string, index_char):
-    #A function that separates a string into lists based on index of a known character
-    # eg. "|test|test1|test2|" => ['test', 'test2', 'test3']
-
-    return_list = []
-    first_index = 0
-    while search_string.find(index_char) != -1:
-        #First occurence:
-        first_index = search_string.find(index_char)
-        single_value = search_string[0: first_index]
-        return_list.append(single_value)
-        search_string = search_string[first_index+1: len(search_string)]
-    
-    return_list.append(search_string)    
-    return return_list
-
 def check_valid_value(input_value):
     #Simple error checking function to ensure that a valid duty cycle is sent
     if isinstance(input_value, int) & ((input_value <= 100) & (input_value >= 0)):
@@ -385,94 +318,90 @@ def client_connection_handler():
     address=(ip_address, port) 
 
 def update_PWM(pwm_pin, duty_cycle):
+    UI_UPDATES.inc()
     if check_valid_value(duty_cycle) == 1:
         print(f"[CONSOLE] Pin: {pwm_pin}, Duty cycle: {duty_cycle}")
-        pwm_message = f"{pwm_pin}_{duty_cycle}" # Main message containing PWM update data
+        pwm_message = build_update(pwm_pin, duty_cycle) # Main message containing PWM update data
         #pwm_message = pwm_message.encode(FORMAT) # Encode main message
         #message_len = len(pwm_message) # Create initial header message detailing main message length
         #message_len = str(message_len).encode(FORMAT) # Encode the header message to be padded
         #message_len += b' ' * (HEADER - len(message_len)) # b here gets the byte representation of the string parameter,
-        if DEBUGGING == False:
-            client.sendto(pwm_message.encode(), address)
+        if DEBUGGING == False and shadow.command({pwm_pin: duty_cycle}): # Skipped if the device already has it
+            transport.send(pwm_message.encode(), address)
     else:
         print("[CONSOLE] Internal error. Duty cycle is of an incorrect type.")
 
 def test_connection():
     #Using the port and address supplied in the config.txt, send device a specific packet
-    #and check for a proper response. 
-    global address
-
+    #and check for a proper response. The reply is handled in test_connection_done() so
+    #the Ping button does not block the Tk thread.
     print(f"[CONSOLE] Pinging device on {address}")
     ping_message = "!PING" # Main message sent to arduino
     if DEBUGGING == False:
-        client.sendto(ping_message.encode(), address)
-        # Response:
-        try:
-            receive_message, address = client.recvfrom(1024)
-            print(receive_message.decode())
-            if receive_message.decode() == 'acknowledged':
-                print('[CONSOLE] Connection successful. Ping was received and server/host correctly responded.')
-        except socket.timeout:
-            print('[CONSOLE] Error: No response received from server/host device. Please check the connection.')
+        ping_future = transport.request(ping_message.encode(), address, reply_equals("acknowledged"))
+        tk_when_done(root, ping_future, test_connection_done)
+
+def test_connection_done(ping_future):
+    # Response:
+    try:
+        receive_message = ping_future.result()
+        print(receive_message.decode())
+        print('[CONSOLE] Connection successful. Ping was received and server/host correctly responded.')
+    except socket.timeout:
+        print('[CONSOLE] Error: No response received from server/host device. Please check the connection.')
 
 def request_config():
     #Using the port and address supplied in the config.txt, send device a specific packet
     #and check for a proper response. 
-    global address
     print(f"[CONSOLE] Requesting config from device on {address}")
     req_message = "!REQUEST_CONFIG" # Main message sent to arduino
     if DEBUGGING == False:
-        client.sendto(req_message.encode(), address)
         # Response:
         try:
-            receive_message, address = client.recvfrom(1024)
+            receive_message = transport.request(req_message.encode(), address, reply_config).result()
             print(receive_message.decode())
-            receive_message = receive_message.decode()
-            if receive_message.find('_') != -1:
-                print('[CONSOLE] Message request successful. Server/host correctly responded.')
-                config_elements = string_splicer(receive_message, "|") # Separates the string to extract each individual pin config
-                pin_0_config = config_elements[0]
-                pin_1_config = config_elements[1]
-                pin_2_config = config_elements[2]
-                pin_3_config = config_elements[3]
-                #print(f"{pin_0_config}")
-                #print(string_splicer(pin_0_config, "_"))
-                [pin_0_onboard_ref, pin_0_dutycycle] = string_splicer(pin_0_config, "_")
-                [pin_1_onboard_ref, pin_1_dutycycle] = string_splicer(pin_1_config, "_")
-                [pin_2_onboard_ref, pin_2_dutycycle] = string_splicer(pin_2_config, "_")
-                [pin_3_onboard_ref, pin_3_dutycycle] = string_splicer(pin_3_config, "_")
-
-                return [[pin_0_onboard_ref  , int(pin_0_dutycycle)], 
-                        [pin_1_onboard_ref  , int(pin_1_dutycycle)],
-                        [pin_2_onboard_ref  , int(pin_2_dutycycle)],
-                        [pin_3_onboard_ref  , int(pin_3_dutycycle)],
-                        [TRUE               , 1]]
+            device_config = parse_config_reply(receive_message) # List of channel_config(pin, duty_cycle)
+            shadow.replace_confirmed(device_config.channels)
+            print('[CONSOLE] Message request successful. Server/host correctly responded.')
+            return device_config.channels
+        except ValueError as e:
+            print(f'[CONSOLE] Error: Incorrect server response (request_config): {e}')
+            return [["0"    , 0],
+                    ["1"    , 0],
+                    ["2"    , 0],
+                    ["3"    , 0]]
         except socket.timeout:
             print('[CONSOLE] Error: No response received from server/host device. Please check the connection.')
             return [["0"    , 0],
                     ["1"    , 0],
                     ["2"    , 0],
-                    ["3"    , 0],
-                    [FALSE  , 0]]
+                    ["3"    , 0]]
 
 def ping_timer_thread():
-    global address
     print("Daemon thread running")
     count = 0
+    link_lost = False
     while True:
         time.sleep(1)
         if count == 5:
             count = 0
-            client.sendto("!PING".encode(), address)
-            # Response:
+            # Response: blocking on our own future is fine here, other callers cannot steal this reply
             try:
-                receive_message, address = client.recvfrom(1024)
+                receive_message = transport.request("!PING".encode(), address, reply_equals("acknowledged")).result()
                 print(receive_message.decode())
                 if receive_message.decode() == 'acknowledged':
-                    connection_update_mess.set("CONN")
+                    ui_queue.post_set(connection_update_mess, "CONN")
                     print("[CONSOLE] Connection status = connected.")
+                    if link_lost:
+                        #Push only the values changed while the link was down, the widgets are left as they are
+                        link_lost = False
+                        diverged = shadow.diverged()
+                        if diverged:
+                            transport.send(build_update_many(diverged).encode(), address)
+                            print(f"[CONSOLE] Resynced {len(diverged)} channel(s) after reconnecting.")
             except socket.timeout:
-                connection_update_mess.set("NO CONN")
+                link_lost = True
+                ui_queue.post_set(connection_update_mess, "NO CONN")
                 print("[CONSOLE] Connection status = no connection.")
         else:
             count += 1
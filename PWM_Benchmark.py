@@ -0,0 +1,227 @@
+#############################################################
+#                PWM Control Path Benchmark                 #
+#############################################################
+#region
+# Description: measures how fast the UI's control path can
+# change duty cycles. It runs headless against simulated
+# devices (PWM_Simulator) and drives the same
+# user_interface.update_PWM, request_config and heartbeat
+# code the real UI uses. The results are printed as JSON so
+# runs can be stored and compared to catch regressions.
+#
+# Date modified: 18/10/2026
+#
+# Usage:
+#   python PWM_Benchmark.py --devices 4 --output results.json
+#
+# Results:
+#   throughput   - update_PWM calls per second, and how long
+#                  until every device showed the final value
+#                  of every pin (newer values may supersede
+#                  older ones on the way, eg. reliable mode)
+#   latency      - update_PWM call to the duty cycle being
+#                  applied on the device, in milliseconds
+#   config       - request_config round trips, milliseconds
+#   heartbeat    - pings per second and RTT stats per device
+#   packets_per_action - datagrams received by the devices
+#                  per update_PWM call (retransmits count)
+#   cpu_us_per_command - process CPU time per update_PWM
+#                  call. The simulator runs in the same
+#                  process, so this includes its share.
+#
+#############################################################
+#endregion
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import tempfile
+import threading
+import time
+from PWM_Simulator import device_simulator, simulated_device
+from PWM_Fleet import fleet_controller
+from PWM_Heartbeat import heartbeat
+from PWM_Metrics import metrics
+from PWM_Logging import setup_logging
+from PWM_Persistence import settings_writer
+from PWM_Journal import journal_writer
+import PWM_Control_UI
+from PWM_Control_UI import user_interface
+
+class headless_ui:
+    #The control path of user_interface without a Tk window, so the benchmark runs without a display.
+    #The methods are user_interface's own, not copies.
+    check_valid_duty_cycle = user_interface.check_valid_duty_cycle
+    update_PWM             = user_interface.update_PWM
+    update_PWM_many        = user_interface.update_PWM_many
+    remember_duty_cycles   = user_interface.remember_duty_cycles
+    request_config         = user_interface.request_config
+    select_pin_configs     = user_interface.select_pin_configs
+    connection_status      = user_interface.connection_status
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.start_with_no_conn = False
+        #Last duty cycles are saved like in the UI, to a scratch file instead of config.txt
+        scratch_directory = tempfile.mkdtemp(prefix="pwm-benchmark-")
+        self.settings_writer = settings_writer(os.path.join(scratch_directory, "config.txt"))
+        self.journal = journal_writer(os.path.join(scratch_directory, "journal.bin")) # Journaled like in the UI
+        self.last_duty_cycles = {}
+
+class benchmark_device(simulated_device):
+    #Simulated device that reports the moment each update is applied
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.applied = threading.Event()
+        self.watch = None # (pin, duty) being waited for
+
+    def _set_duty_cycle(self, pwm_pin, duty_cycle):
+        super()._set_duty_cycle(pwm_pin, duty_cycle)
+        if self.watch == (pwm_pin, duty_cycle):
+            self.applied.set()
+
+def percentiles(samples):
+    #Milliseconds summary of a list of durations in seconds
+    if len(samples) == 0:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered)-1, int(len(ordered)*fraction))]*1000
+    return {
+        "count": len(ordered),
+        "min":   ordered[0]*1000,
+        "p50":   pick(0.50),
+        "p90":   pick(0.90),
+        "p99":   pick(0.99),
+        "max":   ordered[-1]*1000,
+        "mean":  sum(ordered)/len(ordered)*1000,
+    }
+
+def received_packets(simulator):
+    return sum([device.counters["received"] for device in simulator.devices.values()])
+
+def wait_until(condition, timeout):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+def run_throughput(ui, simulator, pins, count):
+    #Fires count updates as fast as update_PWM accepts them, then waits for every device to reach the final values
+    devices = list(simulator.devices.values())
+    final = {int(pins[i % len(pins)]): i % 101 for i in range(max(0, count - len(pins)), count)}
+    packets_before = received_packets(simulator)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(count):
+        ui.update_PWM(pins[i % len(pins)], i % 101)
+    submitted = time.perf_counter()
+    delivered = wait_until(lambda: all([all([device.duty_cycles.get(pwm_pin) == duty_cycle for pwm_pin, duty_cycle in final.items()])
+        for device in devices]), 5)
+    finished = time.perf_counter()
+    cpu = time.process_time() - cpu_start
+    return {
+        "commands": count,
+        "submit_per_sec": count/(submitted - start),
+        "delivered_per_sec": count/(finished - start) if delivered else None,
+        "all_delivered": delivered,
+        "packets_per_action": (received_packets(simulator) - packets_before)/count,
+        "cpu_us_per_command": cpu/count*1e6,
+    }
+
+def run_latency(ui, simulator, pins, count):
+    #One update at a time, timed from the update_PWM call to the first device applying it
+    device = next(iter(simulator.devices.values()))
+    samples = []
+    for i in range(count):
+        pwm_pin, duty_cycle = pins[i % len(pins)], (i*37) % 101
+        if device.duty_cycles.get(int(pwm_pin)) == duty_cycle:
+            duty_cycle = (duty_cycle + 1) % 101 # Must be a change, or it could not be seen
+        device.applied.clear()
+        device.watch = (int(pwm_pin), duty_cycle)
+        start = time.perf_counter()
+        ui.update_PWM(pwm_pin, duty_cycle)
+        if device.applied.wait(1):
+            samples.append(time.perf_counter() - start)
+    device.watch = None
+    return percentiles(samples)
+
+def run_config(ui, count):
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        ui.request_config()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def run_heartbeat(fleet, simulator, seconds):
+    packets_before = received_packets(simulator)
+    monitor = heartbeat(fleet, lambda device, connected: None)
+    monitor.start()
+    time.sleep(seconds)
+    monitor.stop()
+    return {
+        "seconds": seconds,
+        "pings_per_sec": (received_packets(simulator) - packets_before)/seconds,
+        "devices": {f"{host}:{port}": stats for (host, port), stats in monitor.stats().items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PWM control path against simulated devices.")
+    parser.add_argument("--devices", type=int, default=1, help="simulated devices in the fleet")
+    parser.add_argument("--channels", type=int, default=4, help="PWM channels per device")
+    parser.add_argument("--commands", type=int, default=2000, help="update_PWM calls in the throughput run")
+    parser.add_argument("--samples", type=int, default=200, help="timed updates in the latency run")
+    parser.add_argument("--config-samples", type=int, default=50, help="timed request_config calls")
+    parser.add_argument("--heartbeat-seconds", type=float, default=3.0, help="length of the heartbeat run")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated one-way latency, milliseconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="simulated loss probability (0-1)")
+    parser.add_argument("--binary", action="store_true", help="use the binary wire format")
+    parser.add_argument("--sequence", action="store_true", help="tag messages with sequence numbers")
+    parser.add_argument("--reliable", action="store_true", help="acknowledged updates (implies --sequence)")
+    parser.add_argument("--metrics", action="store_true", help="enable PWM_Metrics and include its snapshot")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable() # Off by default so the figures show the hot path as shipped
+    simulator = device_simulator()
+    addresses = simulator.add_devices(args.devices, device_class=benchmark_device, channels=args.channels,
+        latency=args.latency/1000, loss=args.loss, seed=1)
+    transport = PWM_Control_UI.transport # The same transport object the UI uses
+    transport.use_sequence = args.sequence or args.reliable
+    fleet = fleet_controller(transport, addresses, binary_setting=args.binary, reliable=args.reliable)
+    ui = headless_ui(fleet)
+
+    results = {
+        "settings": vars(args),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    devnull = open(os.devnull, "w") # Left open, the log listener thread writes to it until exit
+    with contextlib.redirect_stdout(devnull):
+        #The control path logs on every command. It still does here, only nobody has to read it.
+        setup_logging(logging.INFO, stream=devnull)
+        pins = [str(channel.pin) for channel in ui.request_config()]
+        results["config"] = run_config(ui, args.config_samples)
+        results["throughput"] = run_throughput(ui, simulator, pins, args.commands)
+        results["latency"] = run_latency(ui, simulator, pins, args.samples)
+        results["heartbeat"] = run_heartbeat(fleet, simulator, args.heartbeat_seconds)
+    results["packets_per_action"] = results["throughput"]["packets_per_action"]
+    results["cpu_us_per_command"] = results["throughput"]["cpu_us_per_command"]
+    if args.metrics:
+        results["metrics"] = metrics.snapshot()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    simulator.close()
+
+if __name__ == '__main__':
+    main()
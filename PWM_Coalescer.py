@@ -0,0 +1,70 @@
+#############################################################
+#                 PWM Slider Coalescing Sender              #
+#############################################################
+#region
+# Description: rate-limited sender used for live slider
+# dragging. Every slider movement is submitted, but only the
+# newest value per channel is kept and it is sent at most
+# max_rate_hz times per second. Packet count is therefore
+# bounded no matter how fast the mouse moves, while the
+# hardware still follows the drag closely.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Scheduling uses the widget's after(), so submit()
+#       and release() must be called from the Tk thread.
+#
+#############################################################
+#endregion
+
+import time
+from PWM_Metrics import metrics
+
+DEFAULT_RATE_HZ = 50
+
+# Metrics (see PWM_Metrics)
+VALUES_COALESCED = metrics.counter("pwm_slider_values_coalesced_total", "Slider values replaced by a newer one before being sent")
+
+class coalescing_sender:
+    def __init__(self, widget, send_function, max_rate_hz=DEFAULT_RATE_HZ):
+        self.widget = widget               # Any Tk widget, only used for after()
+        self.send_function = send_function # send_function(pwm_pin, duty_cycle)
+        self.min_interval = 1.0 / max_rate_hz
+        self._latest = {}         # pin -> newest value not sent yet
+        self._last_sent = {}      # pin -> last value sent during the current drag
+        self._last_send_time = {} # pin -> time.monotonic() of the last send
+        self._scheduled = {}      # pin -> after() id of the pending flush
+
+    def submit(self, pwm_pin, duty_cycle):
+        #Called on every slider movement. Sends straight away if the channel has been quiet
+        #for min_interval, otherwise keeps the value and lets the pending flush pick it up.
+        if pwm_pin in self._latest:
+            VALUES_COALESCED.inc()
+        self._latest[pwm_pin] = duty_cycle
+        if pwm_pin in self._scheduled:
+            return
+        wait = self._last_send_time.get(pwm_pin, 0) + self.min_interval - time.monotonic()
+        if wait <= 0:
+            self._flush(pwm_pin)
+        else:
+            self._scheduled[pwm_pin] = self.widget.after(int(wait*1000) + 1, self._flush, pwm_pin)
+
+    def release(self, pwm_pin, duty_cycle):
+        #Called when the drag ends. The final value is always sent immediately (unless it already was)
+        #and the drag state is reset so the next drag starts fresh.
+        after_id = self._scheduled.pop(pwm_pin, None)
+        if after_id is not None:
+            self.widget.after_cancel(after_id)
+        self._latest[pwm_pin] = duty_cycle
+        self._flush(pwm_pin)
+        self._last_sent.pop(pwm_pin, None)
+
+    def _flush(self, pwm_pin):
+        self._scheduled.pop(pwm_pin, None)
+        duty_cycle = self._latest.pop(pwm_pin, None)
+        if duty_cycle is None or duty_cycle == self._last_sent.get(pwm_pin):
+            return
+        self._last_sent[pwm_pin] = duty_cycle
+        self._last_send_time[pwm_pin] = time.monotonic()
+        self.send_function(pwm_pin, duty_cycle)
@@ -0,0 +1,170 @@
+#############################################################
+#                     PWM Config Loader                     #
+#############################################################
+#region
+# Description: reads config.txt once into a typed, validated
+# app_settings object that both PWM_Control_UI and
+# ControlApplication use.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Each line is split on the first '=' and the key has to
+#       match exactly, so no_start_on_no_conn can no longer be
+#       read as start_with_no_conn (or "ip" found inside
+#       another key).
+#   -   Lines containing // are comments. Unknown keys are
+#       logged and ignored.
+#   -   A missing, unparsable or out-of-range setting falls
+#       back to its default with a warning, it no longer stops
+#       the program. A missing config.txt gives all defaults.
+#   -   get_settings() parses the file the first time and
+#       returns the cached object afterwards.
+#   -   config_watcher polls the file's modification time so
+#       a running UI can pick up edits, changed_settings()
+#       tells it which settings to apply.
+#
+#############################################################
+#endregion
+
+import logging
+import os
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILENAME = "config.txt"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+def _parse_bool(value):
+    #config.txt uses 0/1
+    if value.strip() not in ("0", "1"):
+        raise ValueError(f"expected 0 or 1, got {value!r}")
+    return value.strip() == "1"
+
+def _parse_str(value):
+    return value.strip()
+
+def parse_duty_cycles(value):
+    #"3:50,5:20" -> {3: 50, 5: 20}
+    duty_cycles = {}
+    for entry in value.split(","):
+        if entry.strip():
+            pwm_pin, _, duty_cycle = entry.partition(":")
+            duty_cycles[int(pwm_pin)] = int(duty_cycle)
+    return duty_cycles
+
+def format_duty_cycles(duty_cycles):
+    #{3: 50, 5: 20} -> "3:50,5:20", the inverse of parse_duty_cycles
+    return ",".join([f"{pwm_pin}:{duty_cycle}" for pwm_pin, duty_cycle in duty_cycles.items()])
+
+def parse_device_list(value):
+    #"192.168.0.132:5000,192.168.0.133:5000" -> [("192.168.0.132", 5000), ("192.168.0.133", 5000)]
+    addresses = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if entry:
+            host, _, port = entry.rpartition(":")
+            addresses.append((host, int(port)))
+    return addresses
+
+# key: (parser, default, validator or None). Order is the field order of app_settings.
+SETTINGS_SCHEMA = {
+    "ip":                  (_parse_str, "192.168.0.132", lambda value: len(value) > 0),
+    "port":                (int, 5000, lambda value: 0 < value < 65536),
+    "pre_test_connection": (_parse_bool, False, None), # Deprecated, read so it is not reported as unknown
+    "no_start_on_no_conn": (_parse_bool, False, None),
+    "start_with_no_conn":  (_parse_bool, False, None),
+    "sequence_ids":        (_parse_bool, False, None),
+    "binary_protocol":     (_parse_bool, False, None),
+    "devices":             (parse_device_list, [], None),
+    "heartbeat_interval":  (float, 0.5, lambda value: value > 0),
+    "reliable_updates":    (_parse_bool, False, None),
+    "metrics_port":        (int, 0, lambda value: 0 <= value < 65536),
+    "metrics_json":        (_parse_str, "", None),
+    "log_level":           (lambda value: value.strip().upper(), "INFO", lambda value: value in LOG_LEVELS),
+    "journal":             (_parse_str, "", None),
+    "theme":               (_parse_str, "awdark", lambda value: len(value) > 0),
+    "height":              (int, 720, lambda value: value >= 100),
+    "width":               (int, 800, lambda value: value >= 100),
+    "live_drag":           (_parse_bool, False, None),
+    "live_rate_hz":        (float, 50.0, lambda value: value > 0),
+    "last_duty_cycles":    (parse_duty_cycles, {}, lambda value: all([0 <= duty <= 100 for duty in value.values()])),
+}
+
+app_settings = namedtuple("app_settings", list(SETTINGS_SCHEMA.keys()))
+
+DEFAULT_SETTINGS = app_settings(*[default for parser, default, validator in SETTINGS_SCHEMA.values()])
+
+def parse_settings(text):
+    #Parses the contents of a config.txt into app_settings, defaults for anything missing or invalid
+    values = DEFAULT_SETTINGS._asdict()
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if line.find("//") >= 0 or line.strip() == "":
+            continue
+        key, separator, value = line.partition("=")
+        key = key.strip()
+        if not separator:
+            logger.warning("config line %d ignored, no '=': %r", line_number, line)
+            continue
+        if key not in SETTINGS_SCHEMA:
+            logger.warning("config line %d ignored, unknown setting %r", line_number, key)
+            continue
+        parser, default, validator = SETTINGS_SCHEMA[key]
+        try:
+            parsed = parser(value)
+            if validator is not None and not validator(parsed):
+                raise ValueError(f"{parsed!r} is not allowed")
+        except ValueError as e:
+            logger.warning("config setting %s: %s, using the default %r", key, e, default)
+            continue
+        values[key] = parsed
+        logger.debug("%s = %r", key, parsed)
+    return app_settings(**values)
+
+def load_settings(filename=CONFIG_FILENAME):
+    #Reads and parses the file every time, see get_settings() for the cached version
+    try:
+        with open(filename, "r") as f:
+            return parse_settings(f.read())
+    except OSError as e:
+        logger.warning("Could not read %s (%s), using default settings", filename, e)
+        return DEFAULT_SETTINGS
+
+_cache = {} # filename -> app_settings
+
+def get_settings(filename=CONFIG_FILENAME):
+    #Parsed once per process, every later call returns the same object
+    if filename not in _cache:
+        _cache[filename] = load_settings(filename)
+    return _cache[filename]
+
+def reload_settings(filename=CONFIG_FILENAME):
+    #Parses the file again and replaces the cached settings
+    _cache[filename] = load_settings(filename)
+    return _cache[filename]
+
+def changed_settings(old, new):
+    #Names of the settings that differ between two app_settings
+    return [field for field in app_settings._fields if getattr(old, field) != getattr(new, field)]
+
+class config_watcher:
+    #Polls the file's modification time and size, one os.stat() per poll, cheap enough for the Tk thread
+    def __init__(self, filename=CONFIG_FILENAME):
+        self.filename = filename
+        self._stamp = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.filename)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def poll(self):
+        #Returns the reloaded app_settings if the file changed since the last poll, otherwise None
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        return reload_settings(self.filename)
@@ -26,37 +26,101 @@
 #############################################################
 #endregion
 
-import os
-from os import read
-import socket
+import logging
 import tkinter as tk
 from tkinter import *
 from tkinter import messagebox
+from tkinter import filedialog
 from tkinter import ttk
 import sys
-import time
 import threading
+from PWM_Transport import udp_transport, tk_when_done
+from PWM_Protocol import channel_config
+from PWM_Fleet import fleet_controller
+from PWM_Config import get_settings, format_duty_cycles, config_watcher, changed_settings, CONFIG_FILENAME, SETTINGS_SCHEMA
+from PWM_Persistence import settings_writer
+from PWM_Heartbeat import heartbeat
+from PWM_Coalescer import coalescing_sender
+from PWM_UIQueue import ui_update_queue
+from PWM_Metrics import metrics, configure_metrics
+from PWM_Logging import setup_logging, set_level, HOT_PATH
+from PWM_Themes import theme_loader
+from PWM_Ramp import ramp_engine, CURVES
+from PWM_Scenes import scene_library
+from PWM_Playback import open_sequence, sequence_player
+from PWM_Journal import journal_writer
 
 # Global constants
-DEBUGGING = FALSE #Debugging prints additional information for testing program functionality
-client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) #SOCK_STREAM indicates a TCP socket. For udp, use SOCK_DGRAM
-client.settimeout(2) #Sets a 2 second timeout to prevent program hanging if message is not sent.
-#For some reason, I am unable to pass the client to the function. Has to be a global variable. *********
+DEBUGGING = FALSE #Debugging logs additional information for testing program functionality, same as log_level=DEBUG
+logger = logging.getLogger("PWM_Control_UI")
+
+#Placeholder channels, shown until a device config arrives or when running without a connection
+DEFAULT_PIN_CONFIGS = [channel_config(0, 0), channel_config(1, 0), channel_config(2, 0), channel_config(3, 0)]
+
+# Layout constants
+GENERAL_PADX = 2
+GENERAL_PADY = 15
+SCALE_PADY   = 5
+SCALE_IPADX  = 5
+SCALE_IPADY  = 30 #Increase this to increase scale length
+ENTRY_WIDTH  = 10 #Increase this increases Entry widget size
+#Grid geometry handler to layout the GUI
+#Reconfigurable settings for ease of moving components around
+PWM_INPUT_ROWSPAN = 6 #Sets the number of rows the scales span over
+#The reason is so that the side panel can be adjusted to include other settings, buttons, etc.
+PWM_LABEL_ROW = PWM_INPUT_ROWSPAN
+PWM_INPUT_ROW = PWM_INPUT_ROWSPAN
+PWM_SCALE_ROW = 0
+BUTTON_ROW    = PWM_INPUT_ROWSPAN+1
+CONFIG_POLL_MS = 1000 #How often config.txt is checked for edits
+DEFAULT_RAMP_SECONDS = 3.0
+#Settings that are only read at start-up, a change is logged but needs a restart
+RESTART_SETTINGS = ("no_start_on_no_conn", "start_with_no_conn", "metrics_port", "metrics_json", "pre_test_connection", "journal")
+UI_UPDATES = metrics.counter("pwm_ui_updates_total", "update_PWM calls from the UI")
+transport = udp_transport(timeout=2) #Owns the UDP socket. Replies are matched to their request, 2 second timeout per request.
 
 class user_interface(tk.Tk):
     def __init__(self, *args, **kwargs):
         super().__init__()
-        if DEBUGGING ==  TRUE:
-            print(f"[DEBUGGING] args: {args}")
+        logger.debug("args: %s", args)
         #Naming the config settings
-        ip_address   = args[0][0]
-        port         = args[0][1] 
-        self.address = (ip_address, port)
-        self.theme_saved  = args[0][2] 
-        self.height  = args[0][3]
-        self.width   = args[0][4]
-        self.start_with_no_conn = args[0][6]
-        self.initial_conn = args[1]
+        self.settings = args[0] #app_settings from PWM_Config, parsed once in main()
+        self.fleet = args[1] #One device_connection per controller, a single device is a fleet of one
+        self.theme_saved  = self.settings.theme
+        self.themes       = theme_loader(self) # Bundled themes are sourced on first use
+        self.height  = self.settings.height
+        self.width   = self.settings.width
+        self.no_start_on_no_conn = self.settings.no_start_on_no_conn
+        self.start_with_no_conn = self.settings.start_with_no_conn
+        self.live_drag = self.settings.live_drag
+        #Runtime changes (window size, last duty cycles) are saved to config.txt in the background
+        self.settings_writer = settings_writer(CONFIG_FILENAME)
+        self.last_duty_cycles = dict(self.settings.last_duty_cycles)
+        self.duty_cycles_lock = threading.Lock() # last_duty_cycles is written from the Tk, ramp and playback threads
+        #Every command is journaled. After a crash the journal is newer than last_duty_cycles, so it wins.
+        self.journal = None
+        if self.settings.journal:
+            try:
+                self.journal = journal_writer(self.settings.journal)
+                self.last_duty_cycles.update(self.journal.state)
+            except (OSError, ValueError) as e:
+                logger.error("Journal %s disabled: %s", self.settings.journal, e)
+        self.fleet.seed(self.last_duty_cycles) # Pushed to each device once its config shows they are missing
+        self.lost_devices = set() # Addresses the heartbeat lost, resynced when they answer again
+        self.startup_failed = False # Set when no_start_on_no_conn closes the window, main() exits with 1
+        self.startup_pending = True # Until the first config result, only that one may close the window
+        #Live drag: slider movements are streamed to the device, coalesced to at most live_rate_hz per channel
+        self.slider_sender = coalescing_sender(self, self.update_PWM, max_rate_hz=self.settings.live_rate_hz)
+        #Timed ramps run on their own thread, the entries follow them through the ui_queue
+        self.ramps = ramp_engine(self.update_PWM_many, on_change=self.ramp_value_sent)
+        self.ramp_duration = DoubleVar(self, value=DEFAULT_RAMP_SECONDS)
+        self.ramp_curve = StringVar(self, value="linear")
+        #Named duty cycle presets from scenes.txt
+        self.scenes = scene_library()
+        self.scene_name = StringVar(self)
+        #Schedule playback from a CSV or binary file, one player at a time
+        self.player = None
+        self.playback_loop = BooleanVar(self, value=False)
 
         ##### Frame setup: #####
         screen_width  = self.winfo_screenwidth()
@@ -65,146 +129,209 @@ class user_interface(tk.Tk):
         y_pos = int((screen_height/2) - (self.height/2))
         self.geometry(f"{self.width}x{self.height}+{x_pos}+{y_pos}") # width x height + XPOS + YPOS
         self.title("PWM Controller UI")
+        self.bind("<Configure>", self.window_configured)
 
-        style = ttk.Style(self)
-        self.load_awthemes()
-        style.theme_use(self.theme_saved)
-        self.set_background_colour()
-
-        #Request config
-        self.pin_configs = self.request_config()
-
-        #Setup ping thread
+        #Connection message
         self.connection_update_mess = StringVar()
-        #Pin labels, tkinter variables to update the labels according to the pins assigned on uC
-        self.pin_0_onboard_ref = StringVar()
-        self.pin_1_onboard_ref = StringVar()
-        self.pin_2_onboard_ref = StringVar()
-        self.pin_3_onboard_ref = StringVar() 
-
-        #Duty cycle values to update widgets, note that these are not of type integer yet.
-        self.dutyCycle0 = IntVar()
-        self.dutyCycle1 = IntVar()
-        self.dutyCycle2 = IntVar()
-        self.dutyCycle3 = IntVar() 
-
-        #self.ping_thread = threading.Thread(target=self.ping_timer_thread, args=[self.address],daemon=TRUE)
-        self.ping_thread = threading.Thread(target=self.ping_timer_thread, daemon=TRUE)
-        self.ping_thread.start()
-
-        #Setup widgets
+        if self.start_with_no_conn:
+            self.connection_update_mess.set("NO CONN-DEBUG")
+        else:
+            self.connection_update_mess.set("CONNECTING")
+
+        #Setup widgets from the values saved by the last run (placeholders if none), without waiting on the network
+        self.pin_configs = [channel_config(pwm_pin, duty_cycle) for pwm_pin, duty_cycle in self.last_duty_cycles.items()] \
+            or DEFAULT_PIN_CONFIGS
         self.config_widgets()
+        self.update_idletasks() # First paint
 
-        ##### Frame setup end #####
+        #State changes from other threads are queued and applied here in batches, workers never touch widgets
+        self.ui_queue = ui_update_queue(self)
+        self.ui_queue.start()
 
-    def ping_timer_thread(self):
-        print("[CONSOLE] Daemon thread running")
-        count = 0
-        while True:
-            time.sleep(1)
-            if count == 5:
-                count = 0
-                if self.start_with_no_conn:
-                    self.connection_update_mess.set("NO CONN-DEBUG")
-                    print("[CONSOLE] No ping, but thread is still running.")
-                else:
-                    client.sendto("!PING".encode(), self.address)
-                    # Response:
-                    try:
-                        rec_message, some_address = client.recvfrom(1024)
-                        print(f"[CONSOLE] Received: {rec_message.decode()} (ping_timer_thread)")
-                        if rec_message.decode() == 'acknowledged':
-                            print("[CONSOLE] Connection status = connected.")
-                            if self.connection_update_mess.get() == "NO CONN":
-                                #time.sleep(1)
-                                self.pin_configs = self.request_config()
-                                print(f"[CONSOLE] Pin configurations: {self.pin_configs}")
-                                # Reconfigure pins and duty cycles
-                                self.pin_0_onboard_ref.set(self.pin_configs[0][0])
-                                self.pin_1_onboard_ref.set(self.pin_configs[1][0])
-                                self.pin_2_onboard_ref.set(self.pin_configs[2][0])
-                                self.pin_3_onboard_ref.set(self.pin_configs[3][0])
-                                self.dutyCycle0.set(self.pin_configs[0][1])
-                                self.dutyCycle1.set(self.pin_configs[1][1])
-                                self.dutyCycle2.set(self.pin_configs[2][1])
-                                self.dutyCycle3.set(self.pin_configs[3][1])
-                                self.label_reload()
-                                self.connection_update_mess.set("CONN")
-                                rec_message = "CLEAR MESSAGE"
-                        else:
-                            print("[CONSOLE] Error, wrong message request [ping_timer_thread]")
-                    except socket.timeout:
-                        self.connection_update_mess.set("NO CONN")
-                        rec_message = ""
-                        print("[CONSOLE] Connection status = no connection.")
-            else:
-                count += 1
+        #Theme, device config and connectivity check finish after the window is shown
+        self.after(0, self.load_theme)
+        self.request_config_async()
 
-    def config_widgets(self):
-        generalPadx = 2
-        generalPady = 15
-        scalePadx = 5
-        scalePady = 5
-        scaleIPadx = 5
-        scaleIPady = 30 #Increase this to increase scale length
-        entryWidth = 10  #Increase this increases Entry widget size
-        
-        print(f"[CONSOLE] Current arduino setup: {self.pin_configs[0]}, {self.pin_configs[1]}, {self.pin_configs[2]}, {self.pin_configs[3]}")
-        self.pin_0_onboard_ref.set(self.pin_configs[0][0])
-        self.pin_1_onboard_ref.set(self.pin_configs[1][0])
-        self.pin_2_onboard_ref.set(self.pin_configs[2][0])
-        self.pin_3_onboard_ref.set(self.pin_configs[3][0])
-
-        #Duty cycle values to update widgets, note that these are not of type integer yet.
-        self.dutyCycle0.set(self.pin_configs[0][1])
-        self.dutyCycle1.set(self.pin_configs[1][1])
-        self.dutyCycle2.set(self.pin_configs[2][1])
-        self.dutyCycle3.set(self.pin_configs[3][1])
+        #Setup heartbeat, pings every device with a timeout adapted to its measured round-trip time
+        self.heartbeat = heartbeat(self.fleet, self.heartbeat_status_changed, stable_interval=self.settings.heartbeat_interval)
+        if not self.start_with_no_conn:
+            self.heartbeat.start()
 
-        #Connection message
-        self.connection_update_mess = StringVar()
-        if self.initial_conn:
-            self.connection_update_mess.set("CONN")
-        else:
-            self.connection_update_mess.set("NO CONN")
+        #Edits to config.txt are applied to the running UI
+        self.config_watcher = config_watcher(CONFIG_FILENAME)
+        self.after(CONFIG_POLL_MS, self.check_config_file)
 
-        #Create label widgets
-        self.pwmLabel0 = ttk.Label(self, text="Pin "+self.pin_0_onboard_ref.get(), font = "Sans 14 bold")
-        self.pwmLabel1 = ttk.Label(self, text="Pin "+self.pin_1_onboard_ref.get(), font = "Sans 14 bold")
-        self.pwmLabel2 = ttk.Label(self, text="Pin "+self.pin_2_onboard_ref.get(), font = "Sans 14 bold")
-        self.pwmLabel3 = ttk.Label(self, text="Pin "+self.pin_3_onboard_ref.get(), font = "Sans 14 bold")
-        # Seems to be a ttk.Label error that does not allow the use of textvariable,
-        # preventing the text to update according to specific changing text
+        ##### Frame setup end #####
 
-        #Create entry widgets
-        pwmInput0 = ttk.Entry(self, textvariable=self.dutyCycle0, width=entryWidth)
-        pwmInput1 = ttk.Entry(self, textvariable=self.dutyCycle1, width=entryWidth)
-        pwmInput2 = ttk.Entry(self, textvariable=self.dutyCycle2, width=entryWidth)
-        pwmInput3 = ttk.Entry(self, textvariable=self.dutyCycle3, width=entryWidth)
-        connection_update = ttk.Entry(self, textvariable=self.connection_update_mess, width=entryWidth, state=DISABLED)
+    def check_config_file(self):
+        try:
+            new_settings = self.config_watcher.poll()
+            if new_settings is not None:
+                self.apply_settings(new_settings)
+        except Exception:
+            logger.exception("Could not apply the changes to %s", CONFIG_FILENAME)
+        finally:
+            self.after(CONFIG_POLL_MS, self.check_config_file) # Watching carries on whatever went wrong
+
+    def apply_settings(self, settings):
+        #Applies only the settings that changed, nothing is rebuilt for the rest
+        changed = [name for name in changed_settings(self.settings, settings) if not self.saved_by_us(settings, name)]
+        self.settings = settings
+        if len(changed) == 0:
+            return
+        logger.info("config.txt changed: %s", ", ".join(changed))
+        if set(changed) & {"ip", "port", "devices", "binary_protocol", "reliable_updates"}:
+            #Re-target the fleet, the channel widgets stay and are refreshed from the new config reply
+            addresses = settings.devices or [(settings.ip, settings.port)]
+            addresses_changed = self.fleet.reconfigure(addresses, settings.binary_protocol, settings.reliable_updates)
+            if addresses_changed:
+                logger.info("Now controlling %s", addresses)
+            if not self.start_with_no_conn and (addresses_changed or "binary_protocol" in changed):
+                if addresses_changed:
+                    self.connection_update_mess.set("CONNECTING")
+                    self.heartbeat.restart()
+                self.request_config_async() # Also negotiates the binary protocol again
+        if "sequence_ids" in changed or "reliable_updates" in changed:
+            self.fleet.transport.use_sequence = settings.sequence_ids or settings.reliable_updates
+        if "theme" in changed:
+            try:
+                self.themes.use(settings.theme)
+                self.theme_saved = settings.theme
+                self.set_background_colour()
+            except TclError as e:
+                logger.error("Theme %r not applied, keeping %r: %s", settings.theme, self.theme_saved, e)
+        if "heartbeat_interval" in changed:
+            self.heartbeat.stable_interval = settings.heartbeat_interval
+        if "live_drag" in changed:
+            self.live_drag = settings.live_drag
+        if "live_rate_hz" in changed:
+            self.slider_sender.min_interval = 1.0 / settings.live_rate_hz
+        if "log_level" in changed and DEBUGGING != TRUE:
+            set_level(settings.log_level)
+        if ("width" in changed or "height" in changed) and (settings.width, settings.height) != (self.width, self.height):
+            self.width, self.height = settings.width, settings.height
+            self.geometry(f"{self.width}x{self.height}")
+        restart_needed = [name for name in changed if name in RESTART_SETTINGS]
+        if restart_needed:
+            logger.warning("%s only take effect after a restart", ", ".join(restart_needed))
+
+    def saved_by_us(self, settings, name):
+        #True if the setting holds the value settings_writer wrote itself. Compared parsed, as the file
+        #text ("3:50,5:20") and the parsed value ({3: 50, 5: 20}) never look alike.
+        saved = self.settings_writer.saved.get(name)
+        if saved is None or name not in SETTINGS_SCHEMA:
+            return False
+        try:
+            return SETTINGS_SCHEMA[name][0](saved) == getattr(settings, name)
+        except ValueError:
+            return False
+
+    def window_configured(self, event):
+        #Fires for every widget and on every step of a resize, the settings_writer coalesces the saves
+        if event.widget is self and (event.width, event.height) != (self.width, self.height):
+            self.width, self.height = event.width, event.height
+            self.settings_writer.set("width", event.width)
+            self.settings_writer.set("height", event.height)
+
+    def load_theme(self):
+        self.themes.use(self.theme_saved) # Only the saved theme is loaded
+        self.set_background_colour()
 
-        #Create button widgets
-        button0 = ttk.Button(self,text="Set Duty Cycle [0]",command=lambda: self.update_PWM(self.pin_0_onboard_ref.get(),self.dutyCycle0.get()))
-        button1 = ttk.Button(self,text="Set Duty Cycle [1]",command=lambda: self.update_PWM(self.pin_1_onboard_ref.get(),self.dutyCycle1.get())) 
-        button2 = ttk.Button(self,text="Set Duty Cycle [2]",command=lambda: self.update_PWM(self.pin_2_onboard_ref.get(),self.dutyCycle2.get())) 
-        button3 = ttk.Button(self,text="Set Duty Cycle [3]",command=lambda: self.update_PWM(self.pin_3_onboard_ref.get(),self.dutyCycle3.get()))
+    def request_config_async(self):
+        #Asks every device for its config without blocking the Tk thread, config_received() applies the result.
+        #The first one doubles as the start-up connectivity check.
+        if self.start_with_no_conn:
+            return
+        logger.info("Requesting config from %d device(s)", len(self.fleet.devices))
+        config_future = self.fleet.resync_all() # Also pushes saved values a device does not have
+        tk_when_done(self, config_future, self.config_received)
+
+    def config_received(self, config_future):
+        pin_configs = self.select_pin_configs(config_future.result())
+        startup, self.startup_pending = self.startup_pending, False
+        if pin_configs is None:
+            if startup and self.no_start_on_no_conn:
+                #Connection failed at start-up. Later requests (eg. after config.txt re-targets the fleet) only report it.
+                messagebox.showerror("Connection Error", "Error: No response received from server/host device. Please check the connection.")
+                self.startup_failed = True
+                self.destroy()
+                return
+            self.connection_update_mess.set("NO CONN")
+            return
+        logger.info("Pin configurations: %s", pin_configs)
+        self.apply_pin_configs(self.with_commanded(pin_configs))
+        #Channels never commanded are known from the device, scene recall diffs against these values
+        with self.duty_cycles_lock:
+            for config in pin_configs:
+                self.last_duty_cycles.setdefault(int(config.pin), config.duty_cycle)
+        self.connection_update_mess.set(self.connection_status())
+
+    def with_commanded(self, pin_configs):
+        #The device's channels showing the values commanded from here where there are any, so a
+        #reconnect or a restart never overwrites what the operator set
+        return [channel_config(config.pin, self.last_duty_cycles.get(int(config.pin), config.duty_cycle)) for config in pin_configs]
+
+    def heartbeat_status_changed(self, device, connected):
+        #Called by the heartbeat on the transport loop, the UI is updated on the Tk thread.
+        #Keyed per device so only its latest status is applied.
+        self.ui_queue.post(("connection", device.address), self.connection_changed, device, connected)
+
+    def connection_changed(self, device, connected):
+        if device not in self.fleet.devices:
+            return # Removed by a config reload while the status change was queued
+        rtt_stats = self.heartbeat.stats()[device.address]
+        if connected:
+            logger.info("%s connected, rtt avg %.1f ms, rto %.0f ms.", device.address, rtt_stats['avg_ms'], rtt_stats['rto_ms'])
+            if device.address in self.lost_devices:
+                #The link came back, push only what diverged instead of reloading the pin configurations
+                self.lost_devices.discard(device.address)
+                tk_when_done(self, self.fleet.transport.run(device.resync()), lambda future: self.device_resynced(device, future))
+        else:
+            logger.warning("%s connection lost, loss %.0f%%.", device.address, rtt_stats['loss']*100)
+            self.lost_devices.add(device.address)
+        self.connection_update_mess.set(self.connection_status())
 
-        #Create scale (sliders)
-        pwm0Scale = ttk.Scale(self, from_=100, to=0, variable=self.dutyCycle0, length = self.height*4, orient='vertical',
-            command=lambda s:self.dutyCycle0.set('%0.0f' % float(s))) #To remove decimal points, which scales have with ttk
-        pwm0Scale.bind("<ButtonRelease-1>", lambda command: self.update_PWM(self.pin_0_onboard_ref.get(), self.dutyCycle0.get()))
+    def device_resynced(self, device, resync_future):
+        channels = resync_future.result()
+        #Widgets are only touched if the device's channels are not the ones shown, eg. no config was received yet
+        if channels and [str(config.pin) for config in channels] != [str(config.pin) for config in self.pin_configs]:
+            self.apply_pin_configs(self.with_commanded(channels))
+        self.connection_update_mess.set(self.connection_status())
 
-        pwm1Scale = ttk.Scale(self, from_=100, to=0, variable=self.dutyCycle1, length = self.height*4, orient='vertical',
-            command=lambda s:self.dutyCycle1.set('%0.0f' % float(s))) #To remove decimal points, which scales have with ttk
-        pwm1Scale.bind("<ButtonRelease-1>", lambda command: self.update_PWM(self.pin_1_onboard_ref.get(), self.dutyCycle1.get()))
+    def config_widgets(self):
+        logger.debug("Current arduino setup: %s", self.pin_configs)
 
-        pwm2Scale = ttk.Scale(self, from_=100, to=0, variable=self.dutyCycle2, length = self.height*4, orient='vertical',
-            command=lambda s:self.dutyCycle2.set('%0.0f' % float(s))) #To remove decimal points, which scales have with ttk
-        pwm2Scale.bind("<ButtonRelease-1>", lambda command: self.update_PWM(self.pin_2_onboard_ref.get(), self.dutyCycle2.get()))
+        #Connection message
+        connection_update = ttk.Entry(self, textvariable=self.connection_update_mess, width=ENTRY_WIDTH, state=DISABLED)
 
-        pwm3Scale = ttk.Scale(self, from_=100, to=0, variable=self.dutyCycle3, length = self.height*4, orient='vertical',
-            command=lambda s:self.dutyCycle3.set('%0.0f' % float(s))) #To remove decimal points, which scales have with ttk
-        pwm3Scale.bind("<ButtonRelease-1>", lambda command: self.update_PWM(self.pin_3_onboard_ref.get(), self.dutyCycle3.get()))
+        #Create button widgets
+        button_all = ttk.Button(self,text="Set All Duty Cycles",command=lambda: self.update_all_channels())
+
+        #Ramp: fades every channel from its last sent value to its entry over the given time
+        ramp_frame = ttk.Frame(self)
+        ramp_duration = ttk.Entry(ramp_frame, textvariable=self.ramp_duration, width=5)
+        ramp_curve = ttk.Combobox(ramp_frame, textvariable=self.ramp_curve, values=list(CURVES), width=11, state="readonly")
+        ramp_duration.grid(row = 0, column = 0, padx = GENERAL_PADX)
+        ramp_curve.grid(row = 0, column = 1, padx = GENERAL_PADX)
+        button_ramp = ttk.Button(self,text="Ramp All Duty Cycles",command=lambda: self.ramp_all_channels())
+
+        #Scenes: type a name to save the current values, pick one to recall it
+        self.scene_combobox = ttk.Combobox(self, textvariable=self.scene_name, values=self.scenes.names(), width=16)
+        self.scene_combobox.bind('<<ComboboxSelected>>', lambda event: self.recall_scene(self.scene_name.get()))
+        scene_frame = ttk.Frame(self)
+        scene_save = ttk.Button(scene_frame, text="Save Scene", command=lambda: self.save_scene(self.scene_name.get()))
+        scene_recall = ttk.Button(scene_frame, text="Recall", command=lambda: self.recall_scene(self.scene_name.get()))
+        scene_save.grid(row = 0, column = 0, padx = GENERAL_PADX)
+        scene_recall.grid(row = 0, column = 1, padx = GENERAL_PADX)
+
+        #Playback of a timed schedule file, see PWM_Playback for the formats
+        playback_frame = ttk.Frame(self)
+        playback_open  = ttk.Button(playback_frame, text="Play File...", command=lambda: self.open_playback())
+        playback_pause = ttk.Button(playback_frame, text="Pause", command=lambda: self.pause_playback())
+        playback_stop  = ttk.Button(playback_frame, text="Stop", command=lambda: self.stop_playback())
+        playback_loop  = ttk.Checkbutton(playback_frame, text="Loop", variable=self.playback_loop)
+        for column, widget in enumerate([playback_open, playback_pause, playback_stop, playback_loop]):
+            widget.grid(row = 0, column = column, padx = GENERAL_PADX)
 
         # Ping/test connectivity:
         ping_label = ttk.Label(self, text='Ping Device:', font = "Sans 12 bold")
@@ -216,47 +343,144 @@ class user_interface(tk.Tk):
         Grid.rowconfigure(self, 0, weight = 2)
         Grid.rowconfigure(self, 1, weight = 0)
         Grid.rowconfigure(self, 2, weight = 0)
-        #Columns:
-        for no_of_columns in range(0, 7): # Since there are 7 columns
-            if(no_of_columns == 7):
-                Grid.columnconfigure(self, no_of_columns, weight = 1)
-            else:
-                Grid.columnconfigure(self, no_of_columns, weight = 2)
-
-        #Grid geometry handler to layout the GUI
-        #Reconfigurable settings for ease of moving components around
-        PWM_INPUT_ROWSPAN=6 #Sets the number of rows the scales span over
-        #The reason is so that the side panel can be adjusted to include other settings, buttons, etc.
-        PWM_LABEL_ROW = PWM_INPUT_ROWSPAN
-        PWM_INPUT_ROW = PWM_INPUT_ROWSPAN
-        PWM_SCALE_ROW = 0
-        BUTTON_ROW    = PWM_INPUT_ROWSPAN+1
-        
-        #PWM0:
-        self.pwmLabel0.grid(row = PWM_LABEL_ROW, column = 0, sticky = W,  pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        pwmInput0.grid(row = PWM_INPUT_ROW, column = 1, sticky = W,  pady = generalPady)
-        pwm0Scale.grid(row = PWM_SCALE_ROW, column = 0, sticky = '', pady = scalePady, ipady=scaleIPady, columnspan = 2, rowspan=PWM_INPUT_ROWSPAN)
-        button0.grid  (row = BUTTON_ROW,    column = 0, sticky = '', pady = generalPady, padx = generalPadx, columnspan = 2)
-        #PWM1:
-        self.pwmLabel1.grid(row = PWM_LABEL_ROW, column = 2, sticky = W,  pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        pwmInput1.grid(row = PWM_INPUT_ROW, column = 3, sticky = W,  pady = generalPady)
-        pwm1Scale.grid(row = PWM_SCALE_ROW, column = 2, sticky = '', pady = scalePady, ipady=scaleIPady, columnspan=2, rowspan=PWM_INPUT_ROWSPAN)
-        button1.grid  (row = BUTTON_ROW,    column = 2, sticky = '', pady = generalPady, padx = generalPadx, columnspan = 2)
-        #PWM2:
-        self.pwmLabel2.grid(row = PWM_LABEL_ROW, column = 4, sticky = W,  pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        pwmInput2.grid(row = PWM_INPUT_ROW, column = 5, sticky = W,  pady = generalPady)
-        pwm2Scale.grid(row = PWM_SCALE_ROW, column = 4, sticky = '', pady = scalePady, ipady=scaleIPady, columnspan=2, rowspan=PWM_INPUT_ROWSPAN)
-        button2.grid  (row = BUTTON_ROW,    column = 4, sticky = '', pady = generalPady, padx = generalPadx, columnspan = 2)
-        #PWM3:
-        self.pwmLabel3.grid(row = PWM_LABEL_ROW, column = 6, sticky = W,  pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        pwmInput3.grid(row = PWM_INPUT_ROW, column = 7, sticky = W,  pady = generalPady, ipadx=scaleIPadx)
-        pwm3Scale.grid(row = PWM_SCALE_ROW, column = 6, sticky = '', pady = generalPady, ipady=scaleIPady, columnspan=2, rowspan=PWM_INPUT_ROWSPAN)
-        button3.grid  (row = BUTTON_ROW,    column = 6, sticky = '', pady = generalPady, padx = generalPadx, columnspan = 2)
-
-        #Ping/connectivity:
-        ping_label.grid (row = 3, column = 8, sticky = N, pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        ping_button.grid(row = 4, column = 8, sticky = N, pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
-        connection_update.grid(row = 2, column = 8, sticky = N, pady = generalPady, padx = generalPadx, ipadx=scaleIPadx)
+
+        #Side panel widgets and the row each sits on. The panel is placed in the column after the last channel.
+        self.side_panel = [(connection_update, 2), (ping_label, 3), (ping_button, 4), (button_all, 5),
+                           (ramp_frame, 6), (button_ramp, 7), (self.scene_combobox, 8), (scene_frame, 9),
+                           (playback_frame, 10)]
+
+        #One pwm_channel (label, entry, scale and button) per channel reported by the device
+        self.channels = []
+        self.apply_pin_configs(self.pin_configs)
+
+    def apply_pin_configs(self, pin_configs):
+        #Existing channels are updated in place, widgets are only rebuilt when the number of channels changes
+        self.pin_configs = pin_configs
+        if len(pin_configs) == len(self.channels) and len(self.channels) > 0:
+            for channel, config in zip(self.channels, pin_configs):
+                channel.apply_config(config)
+        else:
+            for channel in self.channels:
+                channel.destroy()
+            self.channels = [pwm_channel(self, index, config) for index, config in enumerate(pin_configs)]
+            self.grid_side_panel()
+
+    def grid_side_panel(self):
+        side_column = 2*len(self.channels)
+        Grid.columnconfigure(self, side_column, weight = 1)
+        for widget, row in self.side_panel:
+            widget.grid(row = row, column = side_column, sticky = N, pady = GENERAL_PADY, padx = GENERAL_PADX, ipadx=SCALE_IPADX)
+
+    def update_all_channels(self):
+        self.update_PWM_many({channel.pin_onboard_ref.get(): channel.dutyCycle.get() for channel in self.channels})
+
+    def ramp_all_channels(self):
+        #Starts one ramp per channel from the value sent last (0 if none yet) to the value in its entry
+        try:
+            duration = self.ramp_duration.get()
+        except TclError:
+            logger.error("Ramp time must be a number of seconds.")
+            return
+        for channel in self.channels:
+            pwm_pin, target = channel.pin_onboard_ref.get(), channel.dutyCycle.get()
+            if self.check_valid_duty_cycle(target) == 0:
+                logger.error("Internal error. Duty cycle for pin %s is of an incorrect type.", pwm_pin)
+                continue
+            start = self.last_duty_cycles.get(int(pwm_pin), 0)
+            self.ramps.start(pwm_pin, start, target, max(duration, 0), self.ramp_curve.get())
+
+    def ramp_value_sent(self, pwm_pin, duty_cycle):
+        #Called on the ramp thread for every value sent. Keyed per pin, so the Tk thread only shows the newest.
+        self.ui_queue.post(("duty_cycle", pwm_pin), self.show_duty_cycle, pwm_pin, duty_cycle)
+
+    def show_duty_cycle(self, pwm_pin, duty_cycle):
+        for channel in self.channels:
+            if channel.pin_onboard_ref.get() == pwm_pin:
+                channel.dutyCycle.set(duty_cycle)
+
+    def save_scene(self, name):
+        try:
+            self.scenes.save(name.strip(), {channel.pin_onboard_ref.get(): channel.dutyCycle.get() for channel in self.channels})
+        except (ValueError, TclError) as e:
+            logger.error("Scene not saved: %s", e)
+            return
+        except OSError as e:
+            logger.error("Could not write %s: %s", self.scenes.filename, e)
+            return
+        self.scene_combobox['values'] = self.scenes.names()
+        logger.info("Scene %r saved", name.strip())
+
+    def recall_scene(self, name):
+        #Sends only the channels that differ from the last known values, in one packet per device
+        scene = self.scenes.get(name.strip())
+        if scene is None:
+            logger.error("No scene named %r", name.strip())
+            return
+        for channel in self.channels:
+            pwm_pin = int(channel.pin_onboard_ref.get())
+            if pwm_pin in scene.duty_cycles:
+                self.ramps.cancel(channel.pin_onboard_ref.get())
+                channel.dutyCycle.set(scene.duty_cycles[pwm_pin])
+        changed = scene.changed_pins(self.last_duty_cycles)
+        logger.info("Scene %r: %d of %d channels changed", scene.name, len(changed), len(scene.duty_cycles), extra=HOT_PATH)
+        if len(changed) == 0:
+            return
+        if self.start_with_no_conn:
+            logger.info("No update performed. (start_with_no_conn=1)", extra=HOT_PATH)
+            return
+        self.fleet.send_scene(scene, changed)
+        self.remember_duty_cycles({pwm_pin: scene.duty_cycles[pwm_pin] for pwm_pin in changed}, scene.name)
+
+    def open_playback(self):
+        filename = filedialog.askopenfilename(title="Play schedule",
+            filetypes=[("Schedules", "*.csv *.pwmseq"), ("All files", "*.*")])
+        if not filename:
+            return
+        self.stop_playback()
+        self.ramps.cancel_all()
+        try:
+            source = open_sequence(filename)
+        except (OSError, ValueError) as e:
+            logger.error("Could not open %s: %s", filename, e)
+            return
+        self.player = sequence_player(source, self.playback_send, loop=self.playback_loop.get(),
+            on_finished=lambda: logger.info("Playback of %s finished", filename))
+        self.player.play()
+        logger.info("Playing %s", filename)
+
+    def pause_playback(self):
+        #Pause and resume
+        if self.player is None:
+            return
+        if self.player.playing():
+            self.player.pause()
+            logger.info("Playback paused at %.1f s", self.player.position())
+        else:
+            self.player.play()
+
+    def stop_playback(self):
+        if self.player is not None:
+            self.player.stop()
+            logger.info("Playback stopped, drift: %s", self.player.drift.report())
+            self.player = None
+
+    def playback_send(self, updates):
+        #Called on the playback thread, the channel entries follow through the ui_queue
+        self.update_PWM_many(updates)
+        for pwm_pin, duty_cycle in updates.items():
+            self.ui_queue.post(("duty_cycle", str(pwm_pin)), self.show_duty_cycle, str(pwm_pin), duty_cycle)
+
+    def slider_moved(self, pin_ref, duty_cycle_var, scale_value):
+        self.ramps.cancel(pin_ref.get()) # The slider takes over from a running ramp
+        duty_cycle_var.set('%0.0f' % float(scale_value)) #To remove decimal points, which scales have with ttk
+        if self.live_drag:
+            self.slider_sender.submit(pin_ref.get(), duty_cycle_var.get())
+
+    def slider_released(self, pin_ref, duty_cycle_var):
+        if self.live_drag:
+            self.slider_sender.release(pin_ref.get(), duty_cycle_var.get())
+        else:
+            self.update_PWM(pin_ref.get(), duty_cycle_var.get())
 
     def set_background_colour(self):
         if self.theme_saved == 'awdark':
@@ -280,92 +504,69 @@ class user_interface(tk.Tk):
         else: 
             pass
 
-    def load_awthemes(self):
-        # tell tcl where to find the awthemes packages
-        current_directory = os.getcwd()
-        current_directory = current_directory.replace("\\", "/")
-        current_directory = current_directory[current_directory.find(':')+1:len(current_directory)]
-        if DEBUGGING == TRUE:
-            print(f"[DEBUGGING] load_awthemes current_directory: {current_directory}")
-
-        self.tk.eval("""
-        set dir {/My Projects/PWM_ethernet_controller/awthemes-10.4.0/}
-
-        package ifneeded awthemes 10.4.0 \
-            [list source [file join $dir awthemes.tcl]]
-        package ifneeded colorutils 4.8 \
-            [list source [file join $dir colorutils.tcl]]
-        package ifneeded awdark 7.12 \
-            [list source [file join $dir awdark.tcl]]
-        package ifneeded awlight 7.10 \
-            [list source [file join $dir awlight.tcl]]
-        """)
-        # load the awdark and awlight themes
-        self.tk.call("package", "require", 'awdark')
-        self.tk.call("package", "require", 'awlight')
-        #print(style.theme_names())
-
     def request_config(self):
-        #Using the port and address supplied in the config.txt, send device a specific packet
-        #and check for a proper response. 
-        global client
-        req_message = "!REQUEST_CONFIG" # Main message sent to arduino
+        #Using the devices supplied in the config.txt, request every device's config at once.
+        #Returns a list of channel_config(pin, duty_cycle), one per channel. The channel layout
+        #follows the first device that answered, the rest of the fleet is expected to match it.
+        #Blocking, only for worker threads. The Tk thread uses request_config_async().
         if self.start_with_no_conn:
-            return [["0"    , 0],
-                    ["1"    , 0],
-                    ["2"    , 0],
-                    ["3"    , 0]]
+            return DEFAULT_PIN_CONFIGS
         else:
-            print(f"[CONSOLE] Requesting config from device on {self.address}")
-            client.sendto(req_message.encode(), self.address)
+            logger.info("Requesting config from %d device(s)", len(self.fleet.devices))
             # Response:
-            try:
-                receive_message, address = client.recvfrom(1024)
-                print(receive_message.decode())
-                receive_message = receive_message.decode()
-                if receive_message.find('_') != -1:
-                    print('[CONSOLE] Message request successful. Server/host correctly responded.')
-                    config_elements = string_splicer(receive_message, "|") # Separates the string to extract each individual pin config
-                    pin_0_config = config_elements[0]
-                    pin_1_config = config_elements[1]
-                    pin_2_config = config_elements[2]
-                    pin_3_config = config_elements[3]
-                    #print(f"{pin_0_config}")
-                    #print(string_splicer(pin_0_config, "_"))
-                    [pin_0_onboard_ref, pin_0_dutycycle] = string_splicer(pin_0_config, "_")
-                    [pin_1_onboard_ref, pin_1_dutycycle] = string_splicer(pin_1_config, "_")
-                    [pin_2_onboard_ref, pin_2_dutycycle] = string_splicer(pin_2_config, "_")
-                    [pin_3_onboard_ref, pin_3_dutycycle] = string_splicer(pin_3_config, "_")
-                    receive_message = ""
-                    return [[pin_0_onboard_ref  , int(pin_0_dutycycle)], 
-                            [pin_1_onboard_ref  , int(pin_1_dutycycle)],
-                            [pin_2_onboard_ref  , int(pin_2_dutycycle)],
-                            [pin_3_onboard_ref  , int(pin_3_dutycycle)],
-                            [TRUE               , 1]]
-                else:
-                    print('[CONSOLE] Error: Incorrect server response (request_config)')
-                    return [["0"    , 0],
-                            ["1"    , 0],
-                            ["2"    , 0],
-                            ["3"    , 0]]
-            except socket.timeout:
-                print('[CONSOLE] Error: No response received from server/host device. Please check the connection.')
-                return [["0"    , 0],
-                        ["1"    , 0],
-                        ["2"    , 0],
-                        ["3"    , 0]]
+            return self.select_pin_configs(self.fleet.request_config_all().result()) or DEFAULT_PIN_CONFIGS
+
+    def select_pin_configs(self, results):
+        #results holds one channel_config list (or None) per device, returns the first usable one or None
+        for channels in results:
+            if channels:
+                logger.info("Message request successful. Server/host correctly responded.")
+                return channels
+        logger.error("No device returned a usable config (request_config)")
+        return None
+
+    def connection_status(self):
+        connected = self.fleet.connected_count()
+        if connected == len(self.fleet.devices):
+            return "CONN"
+        elif connected == 0:
+            return "NO CONN"
+        else:
+            return f"{connected}/{len(self.fleet.devices)} CONN"
 
     def update_PWM(self, pwm_pin, duty_cycle):
-        global client
+        UI_UPDATES.inc()
         if self.check_valid_duty_cycle(duty_cycle) == 1:
-            print(f"[CONSOLE] Pin: {pwm_pin}, Duty cycle: {duty_cycle}")
-            pwm_message = f"{pwm_pin}_{duty_cycle}" # Main message containing PWM update data
+            logger.info("Pin: %s, Duty cycle: %s", pwm_pin, duty_cycle, extra=HOT_PATH)
             if self.start_with_no_conn:
-                print("[CONSOLE] No update performed. (start_with_no_conn=1)")
+                logger.info("No update performed. (start_with_no_conn=1)", extra=HOT_PATH)
             else:
-                client.sendto(pwm_message.encode(), self.address)
+                self.fleet.update_PWM(pwm_pin, duty_cycle)
+                self.remember_duty_cycles({pwm_pin: duty_cycle})
+        else:
+            logger.error("Internal error. Duty cycle is of an incorrect type.", extra=HOT_PATH)
+
+    def update_PWM_many(self, updates):
+        #Sends any number of channels in one packet, eg. {"3": 50, "5": 20} -> "3_50|5_20"
+        for pwm_pin, duty_cycle in updates.items():
+            if self.check_valid_duty_cycle(duty_cycle) == 0:
+                logger.error("Internal error. Duty cycle for pin %s is of an incorrect type.", pwm_pin, extra=HOT_PATH)
+                return
+        logger.info("Batch update: %s", updates, extra=HOT_PATH)
+        if self.start_with_no_conn:
+            logger.info("No update performed. (start_with_no_conn=1)", extra=HOT_PATH)
         else:
-            print("[CONSOLE] Internal error. Duty cycle is of an incorrect type.")
+            self.fleet.update_PWM_many(updates)
+            self.remember_duty_cycles(updates)
+
+    def remember_duty_cycles(self, updates, scene_name=None):
+        #Journaled, and saved as last_duty_cycles so the values sent last survive a restart
+        if self.journal is not None:
+            self.journal.record(updates, scene_name)
+        with self.duty_cycles_lock:
+            for pwm_pin, duty_cycle in updates.items():
+                self.last_duty_cycles[int(pwm_pin)] = duty_cycle
+            self.settings_writer.set("last_duty_cycles", format_duty_cycles(self.last_duty_cycles)) # Under the lock, so the newest state is saved last
 
     def check_valid_duty_cycle(self, input_value):
         #Simple error checking function to ensure that a valid duty cycle is sent
@@ -375,149 +576,79 @@ class user_interface(tk.Tk):
             return 0
 
     def test_connection(self):
-         #Using the port and address supplied in the config.txt, send device a specific packet
-        #and check for a proper response. 
-        print(f"[CONSOLE] Pinging device on {self.address}")
-        ping_message = "!PING_test" # Main message sent to arduino
-        client.sendto(ping_message.encode(), self.address)
+        #Send every device a !PING_test and check for a proper response. Runs from the Ping button,
+        #so the replies are handled in test_connection_done() instead of blocking the Tk thread.
+        logger.info("Pinging %d device(s)", len(self.fleet.devices))
+        ping_future = self.fleet.ping_all(test=True)
+        tk_when_done(self, ping_future, self.test_connection_done)
+
+    def test_connection_done(self, ping_future):
         # Response:
-        try:
-            receive_message, address = client.recvfrom(1024)
-            print(f"[CONSOLE] Message received from host: {receive_message.decode()} (test_connection())")
-            if receive_message.decode() == 'acknowledged_test':
-                print('[CONSOLE] Connection successful. Ping was received and server/host correctly responded. (test_connection)')
-                receive_message = "CLEAR MESSAGE"
-                return 1
-        except socket.timeout:
-            print('[CONSOLE] Error: No response received from server/host device. Please check the connection. (test_connection)')
-            return 0
-    
-    def label_reload(self):
-        self.pwmLabel0.configure(text="Pin "+self.pin_0_onboard_ref.get())
-        self.pwmLabel1.configure(text="Pin "+self.pin_1_onboard_ref.get())
-        self.pwmLabel2.configure(text="Pin "+self.pin_2_onboard_ref.get())
-        self.pwmLabel3.configure(text="Pin "+self.pin_3_onboard_ref.get())
-        
-def read_config():
-    FILENAME = "config.txt"
-    lines=[]
-    try:
-        with open(FILENAME, "r") as f:
-            lines=f.read().splitlines()
-            #print(lines)
-            for i in range(len(lines)):
-                # IP address settings:
-                if lines[i].find("//") >= 0:
-                    pass
-                elif lines[i].find("ip") != -1: #If the ip config is found
-                    ip_address = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    ip_address = str(ip_address)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: ip = {ip_address}")
-                # Port settings:
-                elif lines[i].find("port") != -1: #If the ip config is found
-                    port = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    port = int(port)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: port = {port}")
-                #Theme settings
-                elif lines[i].find("theme") != -1: #If the theme config is found
-                    theme_saved = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: theme = {theme_saved}")
-                # height settings
-                elif lines[i].find("height") != -1: #If the config is found
-                    height = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    height = int(height)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: height = {height}")
-                # width settings
-                elif lines[i].find("width") != -1: #If the config is found
-                    width = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    width = int(width)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: width = {width}")
-                # no_start_on_no_conn settings
-                elif lines[i].find("no_start_on_no_conn") != -1: #If the config is found
-                    no_start_on_no_conn = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    no_start_on_no_conn = int(no_start_on_no_conn)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: no_start_on_no_conn = {no_start_on_no_conn}")
-                elif lines[i].find("no_start_on_no_conn") != -1: #If the config is found
-                    no_start_on_no_conn = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    no_start_on_no_conn = int(no_start_on_no_conn)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: no_start_on_no_conn = {no_start_on_no_conn}")
-                # start_with_no_conn settings
-                elif lines[i].find("start_with_no_conn") != -1: #If the config is found
-                    start_with_no_conn = lines[i][lines[i].find('=')+1:len(lines[i])] #Extract setting data
-                    start_with_no_conn = int(start_with_no_conn)
-                    if DEBUGGING == TRUE:
-                        print(f"[DEBUGGING]: start_with_no_conn = {start_with_no_conn}")
-        f.close()
-        return [ip_address, port, theme_saved, height, width, no_start_on_no_conn, start_with_no_conn]
-    except Exception as e:
-        print("Error:"+str(e))
-        sys.exit(1)
+        for device, answered in zip(self.fleet.devices, ping_future.result()):
+            if answered:
+                logger.info("Connection successful. %s correctly responded. (test_connection)", device.address)
+            else:
+                logger.error("No response received from %s. Please check the connection. (test_connection)", device.address)
+        self.connection_update_mess.set(self.connection_status())
+
+class pwm_channel:
+    #State and widgets of one PWM output, built from one channel_config entry of the !REQUEST_CONFIG reply.
+    #Channel index i uses grid columns 2i and 2i+1.
+    def __init__(self, ui, index, config):
+        self.index = index
+        #Pin label and duty cycle, tkinter variables to update the widgets according to the pins assigned on uC
+        self.pin_onboard_ref = StringVar(ui, value=str(config.pin))
+        self.dutyCycle = IntVar(ui, value=config.duty_cycle)
 
-def test_connection(address):
-    #Using the port and address supplied in the config.txt, send device a specific packet
-    #and check for a proper response. 
-    print(f"[CONSOLE] Pinging device on {address}")
-    ping_message = "!PING" # Main message sent to arduino
-    client.sendto(ping_message.encode(), address)
-    # Response:
-    try:
-        receive_message, address = client.recvfrom(1024)
-        print(f"Message received from host: {receive_message.decode()}")
-        if receive_message.decode() == 'acknowledged':
-            print('[CONSOLE] Connection successful. Ping was received and server/host correctly responded.')
-            return 1
-    except socket.timeout:
-        print('[CONSOLE] Error: No response received from server/host device. Please check the connection.')
-        return 0
-
-def string_splicer(search_string, index_char):
-    #A function that separates a string into lists based on index of a known character
-    # eg. "|test|test1|test2|" => ['test', 'test2', 'test3']
-
-    return_list = []
-    first_index = 0
-    while search_string.find(index_char) != -1:
-        #First occurence:
-        first_index = search_string.find(index_char)
-        single_value = search_string[0: first_index]
-        return_list.append(single_value)
-        search_string = search_string[first_index+1: len(search_string)]
-    
-    return_list.append(search_string)    
-    return return_list
+        # Seems to be a ttk.Label error that does not allow the use of textvariable,
+        # so the label text is updated in apply_config()
+        self.label  = ttk.Label(ui, text="Pin "+self.pin_onboard_ref.get(), font = "Sans 14 bold")
+        self.entry  = ttk.Entry(ui, textvariable=self.dutyCycle, width=ENTRY_WIDTH)
+        self.button = ttk.Button(ui, text=f"Set Duty Cycle [{index}]",
+            command=lambda: ui.update_PWM(self.pin_onboard_ref.get(), self.dutyCycle.get()))
+        self.scale  = ttk.Scale(ui, from_=100, to=0, variable=self.dutyCycle, length = ui.height*4, orient='vertical',
+            command=lambda s: ui.slider_moved(self.pin_onboard_ref, self.dutyCycle, s))
+        self.scale.bind("<ButtonRelease-1>", lambda command: ui.slider_released(self.pin_onboard_ref, self.dutyCycle))
+
+        column = 2*index
+        Grid.columnconfigure(ui, column, weight = 2)
+        Grid.columnconfigure(ui, column+1, weight = 2)
+        self.label.grid (row = PWM_LABEL_ROW, column = column,   sticky = W,  pady = GENERAL_PADY, padx = GENERAL_PADX, ipadx=SCALE_IPADX)
+        self.entry.grid (row = PWM_INPUT_ROW, column = column+1, sticky = W,  pady = GENERAL_PADY)
+        self.scale.grid (row = PWM_SCALE_ROW, column = column,   sticky = '', pady = SCALE_PADY, ipady=SCALE_IPADY, columnspan = 2, rowspan=PWM_INPUT_ROWSPAN)
+        self.button.grid(row = BUTTON_ROW,    column = column,   sticky = '', pady = GENERAL_PADY, padx = GENERAL_PADX, columnspan = 2)
+
+    def apply_config(self, config):
+        self.pin_onboard_ref.set(str(config.pin))
+        self.dutyCycle.set(config.duty_cycle)
+        self.label.configure(text="Pin "+self.pin_onboard_ref.get())
+
+    def destroy(self):
+        for widget in (self.label, self.entry, self.scale, self.button):
+            widget.destroy()
 
 def main():
+    #Logging first so reading the config can already log, the level from config.txt is applied after
+    setup_logging(logging.DEBUG if DEBUGGING == TRUE else logging.INFO)
     #Start reading config.txt, for start up settings
-    config_settings = read_config()
-    if DEBUGGING == TRUE:
-        print("[DEBUGGING] DEBUGGING ENABLED")
-        print(config_settings)
-    ip_address  = config_settings[0]
-    port        = config_settings[1] 
-    address = (ip_address, port)
-    no_start_on_no_conn = config_settings[5]
-    start_with_no_conn  = config_settings[6]
-
-    conn_result = 0 # Initial start-up connection result
-    if no_start_on_no_conn & (start_with_no_conn == 0):
-            conn_result = test_connection(address)
-            if conn_result == 0:
-                #Connection failed
-                messagebox.showerror("Connection Error", "Error: No response received from server/host device. Please check the connection.")
-                #messagebox.showinfo("Details", "Error: No response received from server/host device. Please check the connection.")
-                sys.exit(1)
-            else: 
-                conn_result = 1
-
-    app = user_interface(config_settings, conn_result)
+    settings = get_settings()
+    if DEBUGGING != TRUE:
+        set_level(settings.log_level)
+    logger.debug("Config settings: %s", settings)
+    addresses = settings.devices or [(settings.ip, settings.port)]
+    fleet = fleet_controller(transport, addresses, binary_setting=settings.binary_protocol, reliable=settings.reliable_updates)
+    #Tag messages with #<seq>: so replies are routed by ID. Reliable updates need this to match each acknowledgement.
+    transport.use_sequence = settings.sequence_ids or settings.reliable_updates
+    configure_metrics(settings.metrics_port, settings.metrics_json)
+
+    #The connectivity check (no_start_on_no_conn) runs in the background once the window is shown
+    app = user_interface(settings, fleet)
     app.mainloop()
+    app.settings_writer.flush() # Anything changed in the last DEBOUNCE_SECONDS
+    if app.journal is not None:
+        app.journal.close() # Records from the last FLUSH_INTERVAL
+    if app.startup_failed:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,187 @@
+#############################################################
+#                    PWM Fleet Controller                   #
+#############################################################
+#region
+# Description: drives several PWM controllers from one
+# process. Each device gets a device_connection, and the
+# fleet_controller fans pings, config requests and PWM
+# updates out to all of them concurrently over the shared
+# udp_transport, so a fleet costs one round trip (or one
+# timeout) instead of one per device.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   ping_all() and request_config_all() return a
+#       concurrent.futures.Future holding one result per
+#       device, in the same order as fleet.devices. Worker
+#       threads may block on .result(), the Tk thread should
+#       use tk_when_done().
+#   -   A single device is simply a fleet of one.
+#   -   With reliable=True updates are acknowledged and
+#       retransmitted, see PWM_Reliable.
+#
+#############################################################
+#endregion
+
+import asyncio
+import logging
+import socket
+from PWM_Transport import reply_matcher
+from PWM_Reliable import reliable_sender
+from PWM_Shadow import shadow_state
+from PWM_Metrics import metrics
+from PWM_Protocol import PING_MESSAGE, PING_TEST_MESSAGE, REQUEST_CONFIG_MESSAGE, BINARY_CAPABILITY, \
+    encode_command, encode_updates, parse_config_reply
+
+logger = logging.getLogger(__name__)
+
+# Metrics (see PWM_Metrics)
+UPDATES_SKIPPED = metrics.counter("pwm_updates_skipped_total", "Channel updates not sent because the device already has the value")
+RESYNC_PUSHED   = metrics.counter("pwm_resync_pushed_total", "Channel values pushed by a resync after reconnecting")
+
+class device_connection:
+    #One PWM controller on the network and what is known about it
+    def __init__(self, transport, address, binary_setting=False, reliable=False):
+        self.transport = transport
+        self.address = address
+        self.reliable = reliable_sender(self) if reliable else None # None: updates are fire and forget
+        self.binary_setting  = binary_setting # Use the binary wire format if the device offers it
+        self.binary_protocol = False          # Set by request_config once the device has been asked
+        self.channels = []                    # channel_config list from the last config reply
+        self.connected = False
+        self.shadow = shadow_state()          # Commanded and confirmed duty cycles, see PWM_Shadow
+        self.rtt = None                       # rtt_estimator kept up to date by PWM_Heartbeat, None until it runs
+
+    async def ping(self, test=False, timeout=None):
+        #Returns True if the device answered in time. timeout defaults to the transport's.
+        command = PING_TEST_MESSAGE if test else PING_MESSAGE
+        try:
+            await self.transport.request_async(encode_command(command, self.binary_protocol), self.address,
+                reply_matcher(command, self.binary_protocol), timeout)
+            self.connected = True
+        except socket.timeout:
+            self.connected = False
+        return self.connected
+
+    async def request_config(self):
+        #Returns the device's channel_config list, or None if it did not answer properly.
+        #The config request is always sent as text, it is also where the binary format is negotiated.
+        try:
+            receive_message = await self.transport.request_async(encode_command(REQUEST_CONFIG_MESSAGE), self.address,
+                reply_matcher(REQUEST_CONFIG_MESSAGE))
+            device_config = parse_config_reply(receive_message)
+        except socket.timeout:
+            logger.error("No response received from %s. Please check the connection.", self.address)
+            self.connected = False
+            return None
+        except ValueError as e:
+            logger.error("Incorrect server response from %s (request_config): %s", self.address, e)
+            return None
+        self.connected = True
+        self.channels = device_config.channels
+        self.shadow.replace_confirmed(self.channels)
+        self.binary_protocol = bool(self.binary_setting) & (BINARY_CAPABILITY in device_config.capabilities)
+        if self.binary_protocol:
+            logger.info("%s supports the binary wire format, using it for updates and pings.", self.address)
+        return self.channels
+
+    def update_PWM_many(self, updates):
+        #{pin: duty, ...} in one packet, fire and forget unless reliable delivery is enabled.
+        #Channels the device already has at that value are left out.
+        needed = self.shadow.command(updates)
+        UPDATES_SKIPPED.inc(len(updates) - len(needed))
+        if len(needed) > 0:
+            self._send(needed)
+
+    def _send(self, updates):
+        if self.reliable is not None:
+            self.reliable.submit(updates)
+        else:
+            self.transport.send(encode_updates(updates, self.binary_protocol), self.address)
+
+    def send_scene(self, scene, pins):
+        #The pins of a PWM_Scenes.scene as one packet, from its pre-encoded payload
+        needed = self.shadow.command({pwm_pin: scene.duty_cycles[pwm_pin] for pwm_pin in pins})
+        UPDATES_SKIPPED.inc(len(pins) - len(needed))
+        if len(needed) == 0:
+            return
+        if self.reliable is not None:
+            self.reliable.submit(needed)
+        else:
+            self.transport.send(scene.payload(self.binary_protocol, list(needed)), self.address)
+
+    def push_diverged(self):
+        #Sends every commanded value the device is not known to have, in one packet. Returns what was sent.
+        diverged = self.shadow.diverged()
+        if len(diverged) > 0:
+            RESYNC_PUSHED.inc(len(diverged))
+            self._send(diverged)
+        return diverged
+
+    async def resync(self):
+        #After a reconnect: pushes what changed while the link was down straight away, then reads the
+        #device's config (it may have been reset) and pushes whatever still differs. Returns the
+        #channel_config list, or None if the device did not answer.
+        self.push_diverged()
+        channels = await self.request_config()
+        if channels is not None:
+            pushed = self.push_diverged()
+            logger.info("%s resynced, %d channel(s) pushed after the config check", self.address, len(pushed))
+        return channels
+
+class fleet_controller:
+    def __init__(self, transport, addresses, binary_setting=False, reliable=False):
+        self.transport = transport
+        self.devices = [device_connection(transport, address, binary_setting, reliable) for address in addresses]
+
+    def ping_all(self, test=False):
+        #Future resolved with [True/False per device]
+        return self.transport.run(self._gather([device.ping(test) for device in self.devices]))
+
+    def request_config_all(self):
+        #Future resolved with [channel_config list or None per device]
+        return self.transport.run(self._gather([device.request_config() for device in self.devices]))
+
+    def resync_all(self):
+        #Future resolved with [channel_config list or None per device], see device_connection.resync()
+        return self.transport.run(self._gather([device.resync() for device in self.devices]))
+
+    def seed(self, duty_cycles):
+        #Restores commanded values saved by a previous run on every device, nothing is sent
+        for device in self.devices:
+            device.shadow.seed(duty_cycles)
+
+    def reconfigure(self, addresses, binary_setting=False, reliable=False):
+        #Re-targets the fleet without restarting. Devices whose address is unchanged keep their
+        #connection state, new addresses get a fresh device_connection. Returns True if the addresses changed.
+        existing = {device.address: device for device in self.devices}
+        devices = []
+        for address in addresses:
+            device = existing.get(address) or device_connection(self.transport, address, binary_setting, reliable)
+            device.binary_setting = binary_setting # Applied at the next request_config
+            if reliable and device.reliable is None:
+                device.reliable = reliable_sender(device)
+            elif not reliable:
+                device.reliable = None
+            devices.append(device)
+        changed = [device.address for device in devices] != [device.address for device in self.devices]
+        self.devices = devices # Swapped in one assignment, other threads see either the old or the new list
+        return changed
+
+    def update_PWM(self, pwm_pin, duty_cycle):
+        self.update_PWM_many({pwm_pin: duty_cycle})
+
+    def update_PWM_many(self, updates):
+        for device in self.devices:
+            device.update_PWM_many(updates)
+
+    def send_scene(self, scene, pins):
+        for device in self.devices:
+            device.send_scene(scene, pins)
+
+    def connected_count(self):
+        return len([device for device in self.devices if device.connected])
+
+    async def _gather(self, coroutines):
+        return list(await asyncio.gather(*coroutines))
@@ -0,0 +1,167 @@
+#############################################################
+#                 PWM Adaptive Heartbeat                    #
+#############################################################
+#region
+# Description: keeps track of whether each device is
+# reachable. Every ping's round-trip time is measured and
+# fed into an RTT estimator (the same smoothing TCP uses for
+# its retransmit timeout, RFC 6298), which sets the timeout
+# of the next ping. A healthy device is pinged quickly at
+# first and then less often while it stays stable. A device
+# that stops answering is retried with exponential backoff
+# until it comes back.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Runs on the udp_transport's asyncio loop, no extra
+#       threads. on_status_change(device, connected) is called
+#       on that loop, so UI code must hand it to the Tk thread.
+#   -   A device is declared down after LOSS_THRESHOLD pings
+#       in a row go unanswered, so a single lost datagram does
+#       not flip the status.
+#
+#############################################################
+#endregion
+
+import asyncio
+import collections
+from PWM_Metrics import metrics
+
+# Estimator settings (seconds)
+INITIAL_RTO = 1.0   # Timeout used before the first RTT sample
+MIN_RTO     = 0.05  # LAN round trips are ~1 ms, but the device also has a 10 ms loop delay
+MAX_RTO     = 2.0   # Same as the transport's default timeout
+RTT_WINDOW  = 100   # Samples kept for min/avg/p99
+
+# Scheduling settings (seconds)
+MIN_INTERVAL     = 0.1  # Ping interval right after start-up or a status change
+STABLE_INTERVAL  = 0.5  # Ping interval once the link has been stable for a while
+MAX_BACKOFF      = 5.0  # Longest wait between retries while a device is down
+STABLE_AFTER     = 5    # Consecutive answers before the interval starts growing
+LOSS_THRESHOLD   = 2    # Consecutive lost pings before a device is declared down
+
+# Metrics (see PWM_Metrics)
+HEARTBEAT_RTT  = metrics.histogram("pwm_heartbeat_rtt_seconds", "Heartbeat ping round-trip time")
+HEARTBEAT_LOST = metrics.counter("pwm_heartbeat_lost_total", "Heartbeat pings that went unanswered")
+STATUS_CHANGES = metrics.counter("pwm_heartbeat_status_changes_total", "Devices going up or down")
+
+class rtt_estimator:
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.jitter = 0.0
+        self.samples = collections.deque(maxlen=RTT_WINDOW)
+        self.sent = 0
+        self.lost = 0
+
+    def add_sample(self, rtt):
+        self.sent += 1
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt/2
+        else:
+            #RFC 6298: alpha = 1/8, beta = 1/4
+            self.rttvar = 0.75*self.rttvar + 0.25*abs(self.srtt - rtt)
+            self.srtt = 0.875*self.srtt + 0.125*rtt
+            #RFC 3550 interarrival jitter, from consecutive RTT differences
+            self.jitter += (abs(rtt - self.samples[-1]) - self.jitter)/16
+        self.rto = min(max(self.srtt + 4*self.rttvar, MIN_RTO), MAX_RTO)
+        self.samples.append(rtt)
+
+    def add_loss(self):
+        self.sent += 1
+        self.lost += 1
+        #Karn's algorithm: back the timeout off, do not take a sample from a lost ping
+        self.rto = min(self.rto*2, MAX_RTO)
+
+    def stats(self):
+        #RTT figures in milliseconds over the last RTT_WINDOW answered pings
+        if len(self.samples) == 0:
+            return {"sent": self.sent, "lost": self.lost, "loss": 1.0 if self.sent else 0.0,
+                    "rto_ms": self.rto*1000}
+        ordered = sorted(self.samples)
+        return {
+            "sent":      self.sent,
+            "lost":      self.lost,
+            "loss":      self.lost/self.sent,
+            "min_ms":    ordered[0]*1000,
+            "avg_ms":    sum(ordered)/len(ordered)*1000,
+            "p99_ms":    ordered[min(len(ordered)-1, int(len(ordered)*0.99))]*1000,
+            "jitter_ms": self.jitter*1000,
+            "rto_ms":    self.rto*1000,
+        }
+
+class heartbeat:
+    def __init__(self, fleet, on_status_change, stable_interval=STABLE_INTERVAL):
+        self.fleet = fleet
+        self.on_status_change = on_status_change # on_status_change(device, connected), called on the transport loop
+        self.stable_interval = max(stable_interval, MIN_INTERVAL)
+        self.estimators = {device.address: rtt_estimator() for device in fleet.devices}
+        self._tasks = []
+
+    def start(self):
+        self.fleet.transport.run(self._start())
+
+    def stop(self):
+        self.fleet.transport.loop.call_soon_threadsafe(self._stop)
+
+    def restart(self):
+        #Picks up a changed fleet.devices. Devices that stayed keep their RTT estimators.
+        self.stop()
+        self.start()
+
+    def stats(self):
+        #{address: stats dict} for every device
+        return {address: estimator.stats() for address, estimator in self.estimators.items()}
+
+    async def _start(self):
+        self._tasks = [asyncio.ensure_future(self._run_device(device)) for device in self.fleet.devices]
+
+    def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _run_device(self, device):
+        estimator = self.estimators.setdefault(device.address, rtt_estimator())
+        device.rtt = estimator # Lets reliable delivery time its retransmits from the measured RTO
+        loop = asyncio.get_running_loop()
+        interval = MIN_INTERVAL
+        answered_in_row = 0
+        lost_in_row = 0
+        status = None # Unknown until the first ping, so the first result is always reported
+        while True:
+            start = loop.time()
+            answered = await device.ping(timeout=estimator.rto)
+            if answered:
+                estimator.add_sample(loop.time() - start)
+                HEARTBEAT_RTT.observe(loop.time() - start)
+                answered_in_row += 1
+                lost_in_row = 0
+                if status is not True:
+                    status = True
+                    interval = MIN_INTERVAL
+                    STATUS_CHANGES.inc()
+                    self.on_status_change(device, True)
+                elif answered_in_row >= STABLE_AFTER:
+                    interval = min(max(interval, MIN_INTERVAL)*2, self.stable_interval)
+                else:
+                    interval = max(interval, MIN_INTERVAL)
+            else:
+                estimator.add_loss()
+                HEARTBEAT_LOST.inc()
+                answered_in_row = 0
+                lost_in_row += 1
+                if lost_in_row < LOSS_THRESHOLD and status is not False:
+                    interval = 0 # Suspect, confirm straight away rather than after a full interval
+                elif status is not False:
+                    status = False
+                    interval = MIN_INTERVAL
+                    STATUS_CHANGES.inc()
+                    self.on_status_change(device, False)
+                else:
+                    interval = min(max(interval*2, MIN_INTERVAL), MAX_BACKOFF)
+            #Sleep until the next ping is due, measured from when this one was sent so the rate does not drift
+            await asyncio.sleep(max(0, start + interval - loop.time()))
@@ -0,0 +1,252 @@
+#############################################################
+#                     PWM Command Journal                   #
+#############################################################
+#region
+# Description: append-only binary record of every duty cycle
+# command (updates and scene recalls) with the time it was
+# sent. After a crash or power loss replay_journal() rebuilds
+# the last commanded state, and the journal shows what was
+# sent and when.
+#
+# Date modified: 18/10/2026
+#
+# File format (big-endian):
+#   JOURNAL_MAGIC, then records of
+#   length (2 bytes) | type (1 byte) | time (float64, unix) |
+#   payload (length bytes) | crc32 of everything before it
+#   (4 bytes).
+#   Payloads:
+#     RECORD_UPDATE    [pin (1 byte) | duty (1 byte)] x n
+#     RECORD_SCENE     name length (1 byte) | name (UTF-8) |
+#                      [pin | duty] x n
+#     RECORD_SNAPSHOT  [pin | duty] x n, the full state
+#
+# Usage:
+#   python PWM_Journal.py journal.bin          (audit listing)
+#   python PWM_Journal.py journal.bin --state  (replayed state)
+#
+# Notes:
+#   -   record() only appends to a list under a lock, the
+#       encoding, write and fsync happen on a background
+#       thread in batches of up to FLUSH_INTERVAL, so the
+#       send path never waits on the disk.
+#   -   A snapshot of the whole state is written every
+#       SNAPSHOT_EVERY records. Once the file passes
+#       COMPACT_BYTES it is kept as <filename>.1 (replacing
+#       the previous one) and a new journal starts with a
+#       snapshot, so replay stays fast and disk use bounded.
+#       The new journal replaces the old one in a single
+#       os.replace(), there is never a moment without one.
+#   -   A record cut short by a crash fails its CRC. Replay
+#       stops there and the writer truncates it before
+#       appending.
+#   -   Pins are ints, like last_duty_cycles in PWM_Config.
+#
+#############################################################
+#endregion
+
+import argparse
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from PWM_Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MAGIC   = b"PWMJRN1\n"
+RECORD_HEADER   = struct.Struct("!HBd") # payload length, type, time
+RECORD_CRC      = struct.Struct("!I")
+RECORD_PAIR     = struct.Struct("!BB")  # pin, duty
+RECORD_UPDATE   = 0x01
+RECORD_SCENE    = 0x02
+RECORD_SNAPSHOT = 0x03
+RECORD_NAMES    = {RECORD_UPDATE: "update", RECORD_SCENE: "scene", RECORD_SNAPSHOT: "snapshot"}
+
+FLUSH_INTERVAL = 0.2        # Seconds records may wait before being written and synced
+SNAPSHOT_EVERY = 1000       # Records between snapshots
+COMPACT_BYTES  = 4*1024*1024 # Journal size that starts a new file
+
+# Metrics (see PWM_Metrics)
+JOURNAL_RECORDS = metrics.counter("pwm_journal_records_total", "Records written to the command journal")
+JOURNAL_FLUSHES = metrics.counter("pwm_journal_flushes_total", "Batched journal writes (one fsync each)")
+JOURNAL_PENDING = metrics.gauge("pwm_journal_pending", "Journal records waiting to be written")
+
+##### Codec #####
+def encode_record(record_type, timestamp, updates, name=""):
+    payload = bytearray()
+    if record_type == RECORD_SCENE:
+        encoded_name = name.encode()[:255]
+        payload += bytes([len(encoded_name)]) + encoded_name
+    for pwm_pin, duty_cycle in updates.items():
+        payload += RECORD_PAIR.pack(int(pwm_pin), duty_cycle)
+    record = RECORD_HEADER.pack(len(payload), record_type, timestamp) + payload
+    return record + RECORD_CRC.pack(zlib.crc32(record))
+
+def read_journal(filename):
+    #Yields (offset after the record, type, time, scene name or "", {pin: duty}). Stops at the first
+    #damaged or incomplete record, the offset of the last good one marks where the file is intact.
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) < len(JOURNAL_MAGIC):
+        return # Created but never written, eg. a crash right after start-up
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError(f"{filename} is not a PWM journal")
+    offset = len(JOURNAL_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        length, record_type, timestamp = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end + RECORD_CRC.size > len(data) or \
+           RECORD_CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+            logger.warning("%s: damaged record at byte %d, the rest is ignored", filename, offset)
+            return
+        payload = data[offset + RECORD_HEADER.size:end]
+        name = ""
+        if record_type == RECORD_SCENE:
+            name = payload[1:1 + payload[0]].decode(errors="replace")
+            payload = payload[1 + payload[0]:]
+        updates = {pwm_pin: duty_cycle for pwm_pin, duty_cycle in RECORD_PAIR.iter_unpack(payload)}
+        offset = end + RECORD_CRC.size
+        yield offset, record_type, timestamp, name, updates
+
+def replay_journal(filename):
+    #Returns ({pin: duty} last commanded, time of the last record or None, intact length of the file).
+    #A missing journal gives an empty state.
+    state, last_time, intact = {}, None, len(JOURNAL_MAGIC)
+    try:
+        for offset, record_type, timestamp, name, updates in read_journal(filename):
+            if record_type == RECORD_SNAPSHOT:
+                state = updates
+            else:
+                state.update(updates)
+            last_time, intact = timestamp, offset
+    except FileNotFoundError:
+        pass
+    return state, last_time, intact
+
+##### Writer #####
+class journal_writer:
+    def __init__(self, filename, flush_interval=FLUSH_INTERVAL, snapshot_every=SNAPSHOT_EVERY, compact_bytes=COMPACT_BYTES):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.compact_bytes = compact_bytes
+        #Rebuilt from the file, so snapshots written by this run include what earlier runs commanded
+        self.state, last_time, intact = replay_journal(filename)
+        self._since_snapshot = 0
+        self._file = self._open(intact)
+        self._pending = [] # (type, time, updates, name) not written yet
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock() # close() and the thread never write at the same time
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, updates, scene_name=None):
+        #Thread-safe and cheap, called on the send path. updates is {pin: duty}.
+        entry = (RECORD_SCENE if scene_name else RECORD_UPDATE, time.time(), dict(updates), scene_name or "")
+        with self._condition:
+            self._pending.append(entry)
+            JOURNAL_PENDING.set(len(self._pending))
+            if len(self._pending) == 1:
+                self._condition.notify()
+
+    def close(self):
+        #Writes whatever is pending, on the calling thread
+        with self._condition:
+            pending, self._pending = self._pending, []
+        self._write(pending)
+        with self._write_lock:
+            self._file.close()
+
+    def _open(self, intact):
+        #Opens for appending, cutting off a record a crash left half written
+        if not os.path.exists(self.filename) or os.path.getsize(self.filename) < len(JOURNAL_MAGIC):
+            with open(self.filename, "wb") as f:
+                f.write(JOURNAL_MAGIC)
+        elif os.path.getsize(self.filename) > intact:
+            logger.warning("Truncating %s to %d bytes, the last record was incomplete", self.filename, intact)
+            with open(self.filename, "r+b") as f:
+                f.truncate(intact)
+        return open(self.filename, "ab")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while len(self._pending) == 0:
+                    self._condition.wait()
+            time.sleep(self.flush_interval) # Let a burst of records collect into one write
+            with self._condition:
+                pending, self._pending = self._pending, []
+                JOURNAL_PENDING.set(0)
+            self._write(pending)
+
+    def _write(self, pending):
+        if len(pending) == 0:
+            return
+        with self._write_lock:
+            if self._file.closed:
+                return
+            chunks = []
+            for record_type, timestamp, updates, name in pending:
+                chunks.append(encode_record(record_type, timestamp, updates, name))
+                self.state.update({int(pwm_pin): duty_cycle for pwm_pin, duty_cycle in updates.items()})
+            self._since_snapshot += len(pending)
+            if self._since_snapshot >= self.snapshot_every:
+                chunks.append(encode_record(RECORD_SNAPSHOT, time.time(), self.state))
+                self._since_snapshot = 0
+            try:
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                if self._file.tell() >= self.compact_bytes:
+                    self._compact()
+            except OSError as e:
+                logger.error("Could not write to journal %s: %s", self.filename, e)
+                return
+            JOURNAL_RECORDS.inc(len(pending))
+            JOURNAL_FLUSHES.inc()
+
+    def _compact(self):
+        #The full journal becomes <filename>.1, the new one starts with a snapshot of the state
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            f.write(JOURNAL_MAGIC + encode_record(RECORD_SNAPSHOT, time.time(), self.state))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        #The old journal is linked (or copied) to .1 first, so the live file is only ever swapped by the single
+        #atomic replace below. A crash at any point leaves a complete journal at filename.
+        archive_filename = self.filename + ".1"
+        if os.path.exists(archive_filename):
+            os.unlink(archive_filename)
+        try:
+            os.link(self.filename, archive_filename)
+        except OSError:
+            shutil.copyfile(self.filename, archive_filename) # File systems without hard links
+        os.replace(temp_filename, self.filename)
+        self._file = open(self.filename, "ab")
+        self._since_snapshot = 0
+        logger.info("Journal %s compacted, previous records kept in %s.1", self.filename, self.filename)
+
+def main():
+    parser = argparse.ArgumentParser(description="List a PWM command journal or show the state it replays to.")
+    parser.add_argument("filename", help="journal file, eg. journal.bin")
+    parser.add_argument("--state", action="store_true", help="only print the replayed duty cycles")
+    args = parser.parse_args()
+    if args.state:
+        state, last_time, intact = replay_journal(args.filename)
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_time)) if last_time else "never"
+        print(f"Last command: {when}")
+        for pwm_pin, duty_cycle in sorted(state.items()):
+            print(f"Pin {pwm_pin}: {duty_cycle}")
+        return
+    for offset, record_type, timestamp, name, updates in read_journal(args.filename):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp*1000) % 1000:03d}"
+        label = f"{RECORD_NAMES.get(record_type, hex(record_type))} {name}".strip()
+        print(f"{when}  {label:<20} {updates}")
+
+if __name__ == '__main__':
+    main()
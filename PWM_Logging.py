@@ -0,0 +1,107 @@
+#############################################################
+#                       PWM Logging                         #
+#############################################################
+#region
+# Description: leveled logging for the application. Log
+# calls only put the record on a queue, a QueueListener
+# thread does the formatting and the console/file I/O, so a
+# slow or redirected terminal can never stall the Tk thread
+# or the transport loop.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Modules log through logging.getLogger(__name__) and
+#       pass arguments instead of f-strings, so nothing is
+#       formatted for a level that is switched off.
+#   -   Messages on hot paths (every slider release, every
+#       update) pass extra=HOT_PATH. Each such call site
+#       gets RATE_LIMIT_BURST messages per
+#       RATE_LIMIT_INTERVAL, the rest are counted and the
+#       count is reported on the next message let through.
+#   -   Records are formatted on the listener thread, so
+#       log arguments must not be changed after the call.
+#
+#############################################################
+#endregion
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+RATE_LIMIT_INTERVAL = 1.0 # Seconds
+RATE_LIMIT_BURST    = 5   # Hot-path messages per call site per interval
+
+HOT_PATH = {"rate_limit": True} # extra= for log calls on hot paths
+
+class rate_limit_filter(logging.Filter):
+    #Runs in the logging thread before the record is queued, so it has to stay cheap
+    def __init__(self, interval=RATE_LIMIT_INTERVAL, burst=RATE_LIMIT_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._windows = {} # (logger name, line) -> [window start, messages let through, messages suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "rate_limit", False):
+            return True
+        now = time.monotonic()
+        key = (record.name, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+class deferred_queue_handler(logging.handlers.QueueHandler):
+    #The standard QueueHandler formats the message before queueing it. This one queues the record
+    #as it is so the listener thread does the formatting.
+    def prepare(self, record):
+        return record
+
+_listener = None
+
+def setup_logging(level=logging.INFO, filename=None, stream=None):
+    #Routes every logger through the queue to stream (stdout by default) and optionally a file.
+    #Safe to call more than once, later calls only change the level.
+    global _listener
+    root = logging.getLogger()
+    set_level(level)
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    handler = deferred_queue_handler(log_queue)
+    handler.addFilter(rate_limit_filter())
+    root.handlers = [handler]
+    formatter = logging.Formatter(LOG_FORMAT)
+    outputs = [logging.StreamHandler(stream or sys.stdout)]
+    if filename:
+        outputs.append(logging.FileHandler(filename))
+    for output in outputs:
+        output.setFormatter(formatter)
+    _listener = logging.handlers.QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop) # Flushes whatever is still queued on exit
+
+def set_level(level):
+    #level is a logging constant or a name from config.txt, eg. "DEBUG"
+    if isinstance(level, str):
+        level = logging.getLevelName(level.strip().upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    logging.getLogger().setLevel(level)
@@ -0,0 +1,198 @@
+#############################################################
+#                       PWM Metrics                         #
+#############################################################
+#region
+# Description: counters, gauges and histograms for the hot
+# paths: packets sent and received, request round trips,
+# send latency, timeouts, retransmits and queue depths.
+# They can be read from a local Prometheus-text endpoint
+# (http://127.0.0.1:<port>/metrics, /metrics.json for JSON)
+# or dumped to a JSON file every few seconds.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Everything is off until enable() (or one of the
+#       exporters) is called. While off, every inc()/set()/
+#       observe() returns after a single attribute check.
+#   -   Instruments are created at import time by the module
+#       that owns them, eg. PWM_Transport.REQUEST_RTT, and
+#       are safe to update from any thread.
+#
+#############################################################
+#endregion
+
+import bisect
+import http.server
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, 100 us to 2 s (the transport's default timeout)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+JSON_DUMP_INTERVAL = 10 # Seconds between JSON dumps
+
+class metrics_registry:
+    def __init__(self):
+        self.enabled = False
+        self.instruments = {} # name -> counter/gauge/histogram, in creation order
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def counter(self, name, help_text):
+        return self._add(counter(self, name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._add(gauge(self, name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._add(histogram(self, name, help_text, buckets))
+
+    def _add(self, instrument):
+        #The same name always gives back the same instrument, so modules can be reloaded safely
+        return self.instruments.setdefault(instrument.name, instrument)
+
+    ##### Export #####
+    def snapshot(self):
+        #{name: value} for counters and gauges, {name: {"count", "sum", "buckets"}} for histograms
+        with self._lock:
+            return {name: instrument.snapshot() for name, instrument in self.instruments.items()}
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for instrument in self.instruments.values():
+                lines.append(f"# HELP {instrument.name} {instrument.help_text}")
+                lines.append(f"# TYPE {instrument.name} {instrument.kind}")
+                lines.extend(instrument.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        #Serves /metrics (Prometheus text) and /metrics.json from a daemon thread
+        self.enable()
+        registry = self
+        class metrics_handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Scrapes are not worth a console line each
+        server = http.server.ThreadingHTTPServer((host, port), metrics_handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def start_json_dump(self, filename, interval=JSON_DUMP_INTERVAL):
+        #Rewrites filename with snapshot() every interval seconds from a daemon thread
+        self.enable()
+        def dump_loop():
+            while True:
+                time.sleep(interval)
+                self.write_json(filename)
+        threading.Thread(target=dump_loop, daemon=True).start()
+
+    def write_json(self, filename):
+        #Written to a temporary file first so a reader never sees half a dump
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "w") as f:
+            json.dump({"time": time.time(), "metrics": self.snapshot()}, f, indent=2)
+        os.replace(temp_filename, filename)
+
+class counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        if not self.registry.enabled:
+            return
+        with self.registry._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus_lines(self):
+        return [f"{self.name} {self.value}"]
+
+class gauge(counter):
+    kind = "gauge"
+
+    def set(self, value):
+        if not self.registry.enabled:
+            return
+        self.value = value # A single assignment, no lock needed
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+class histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, buckets):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0]*(len(self.buckets) + 1) # Last entry is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum,
+                "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self._cumulative())}}
+
+    def prometheus_lines(self):
+        lines = [f'{self.name}_bucket{{le="{bound}"}} {count}' for bound, count in zip(self.buckets + ("+Inf",), self._cumulative())]
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+    def _cumulative(self):
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+# The registry shared by every module in the application
+metrics = metrics_registry()
+
+def configure_metrics(metrics_port, metrics_json):
+    #Starts whichever exporters config.txt asks for. Both off leaves metrics disabled.
+    if metrics_port:
+        metrics.start_http_server(metrics_port)
+        logger.info("Metrics on http://127.0.0.1:%d/metrics", metrics_port)
+    if metrics_json:
+        metrics.start_json_dump(metrics_json)
+        logger.info("Metrics written to %s every %d s", metrics_json, JSON_DUMP_INTERVAL)
@@ -0,0 +1,124 @@
+#############################################################
+#                   PWM Config Persistence                  #
+#############################################################
+#region
+# Description: saves settings changed at runtime (theme,
+# window size, last duty cycles) back into config.txt. Changes
+# are collected and written together once they stop coming
+# in for DEBOUNCE_SECONDS (or at the latest MAX_DELAY_SECONDS
+# after the first of them), by a background thread, and the
+# file is replaced atomically so a crash mid-write can never
+# leave a half-written config.txt behind.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   set() is thread-safe and only stores the value, it is
+#       cheap enough for <Configure> events and every update.
+#   -   A steady stream of changes (a ramp, playback) never
+#       goes quiet, MAX_DELAY_SECONDS still gets it written
+#       regularly.
+#   -   Only the key=value lines that changed are replaced,
+#       comments and other settings are kept as they are.
+#       Keys not in the file yet are appended.
+#   -   Call flush() before exiting so the last changes are
+#       not lost with the daemon thread.
+#
+#############################################################
+#endregion
+
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS  = 1.0 # Quiet time before pending changes are written
+MAX_DELAY_SECONDS = 5.0 # Longest a change waits while new ones keep coming
+
+class settings_writer:
+    def __init__(self, filename, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.filename = filename
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._pending = {}        # key -> value (str) not written yet
+        self.saved = {}           # key -> value (str) this writer last wrote, lets a file watcher skip its own changes
+        self._last_change = 0.0   # time.monotonic() of the newest set()
+        self._first_change = 0.0  # time.monotonic() of the oldest set() not written yet
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock() # flush() and the thread never write at the same time
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set(self, key, value):
+        #Thread-safe. The newest value per key wins.
+        with self._condition:
+            if not self._pending:
+                self._first_change = time.monotonic()
+            self._pending[key] = str(value)
+            self._last_change = time.monotonic()
+            self._condition.notify()
+
+    def flush(self):
+        #Writes pending changes now, on the calling thread
+        self._write_pending()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                #Wait until no new change has arrived for debounce seconds, or the oldest has waited max_delay
+                while self._pending:
+                    now = time.monotonic()
+                    wait = min(self._last_change + self.debounce, self._first_change + self.max_delay) - now
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+            self._write_pending()
+
+    def _write_pending(self):
+        #The batch is taken under the write lock, so batches reach the file in the order they were taken
+        #and an older one can never overwrite a newer one
+        with self._write_lock:
+            with self._condition:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                write_settings(self.filename, pending)
+                self.saved.update(pending)
+                logger.debug("Saved %s to %s", sorted(pending), self.filename)
+            except OSError as e:
+                logger.error("Could not save settings to %s: %s", self.filename, e)
+
+def write_settings(filename, changes):
+    #Replaces the key=value lines in filename for every key in changes, atomically
+    try:
+        with open(filename, "r") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    remaining = dict(changes)
+    for i in range(len(lines)):
+        if lines[i].find("//") >= 0:
+            continue
+        key, separator, value = lines[i].partition("=")
+        if separator and key.strip() in remaining:
+            lines[i] = f"{key.strip()}={remaining.pop(key.strip())}"
+    for key, value in remaining.items():
+        lines.append(f"{key}={value}")
+    #Temporary file in the same directory, so the rename never crosses file systems
+    directory = os.path.dirname(os.path.abspath(filename))
+    descriptor, temp_filename = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, "w") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
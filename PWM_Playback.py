@@ -0,0 +1,315 @@
+#############################################################
+#                 PWM Sequence Playback                     #
+#############################################################
+#region
+# Description: plays long precomputed duty cycle schedules
+# to the controller. The file is streamed row by row, never
+# loaded whole, so memory use is the same for a minute or
+# for hours of rows. Each row is sent at its timestamp as
+# one batched update, with pause, seek and loop, and the
+# timing drift (how late each row went out) is reported.
+#
+# Date modified: 18/10/2026
+#
+# File formats:
+#   CSV, a header naming the pins, then one row per step:
+#       time,3,5,6,9
+#       0.0,0,0,0,0
+#       0.5,20,,,        <- blank cells keep their value
+#   Time is in seconds from the start and must not go down.
+#   Lines starting with # are comments. Rows that do not
+#   parse, or hold a duty cycle outside 0-100, are skipped
+#   with a warning.
+#
+#   Binary (.pwmseq), memory-mapped: SEQUENCE_MAGIC, then
+#   fixed records of time (float64) | pin (1 byte) |
+#   duty (1 byte), big-endian. Consecutive records with the
+#   same time are sent as one batch. --convert turns a CSV
+#   into this format.
+#
+# Usage:
+#   python PWM_Playback.py schedule.csv --ip 192.168.0.132 --port 5000 --loop
+#   python PWM_Playback.py schedule.csv --convert schedule.pwmseq
+#
+# Notes:
+#   -   Rows are due at a fixed origin plus their timestamp,
+#       so a late row never delays the ones after it.
+#   -   seek() rescans the file from the start, keeping only
+#       the newest value per pin, and sends that state before
+#       carrying on. Still flat memory, but not instant on
+#       very long CSV files.
+#   -   send_function is called on the playback thread.
+#   -   open_sequence() raises ValueError for a file it cannot
+#       play, an error while playing stops the player.
+#
+#############################################################
+#endregion
+
+import argparse
+import csv
+import logging
+import mmap
+import struct
+import threading
+import time
+from PWM_Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_MAGIC  = b"PWMSEQ1\n"
+SEQUENCE_RECORD = struct.Struct("!dBB") # time, pin, duty
+LATE_THRESHOLD  = 0.005 # Seconds, rows sent later than this count as late in the drift report
+
+# Metrics (see PWM_Metrics)
+PLAYBACK_DRIFT = metrics.histogram("pwm_playback_drift_seconds", "How late each playback row was sent")
+PLAYBACK_ROWS  = metrics.counter("pwm_playback_rows_total", "Playback rows sent")
+
+##### Sources #####
+class csv_sequence:
+    def __init__(self, filename):
+        #Reads the header straight away, raises ValueError if it does not name the pins
+        self.filename = filename
+        with open(self.filename, "r", newline="") as f:
+            self.pins = self._read_header(csv.reader(f))
+
+    def _read_header(self, reader):
+        header = next(reader, None)
+        if header is None or len(header) < 2:
+            raise ValueError(f"{self.filename} has no header, expected eg. time,3,5,6,9")
+        try:
+            return [int(pwm_pin) for pwm_pin in header[1:]]
+        except ValueError:
+            raise ValueError(f"{self.filename}: header columns after time must be pin numbers, got {header[1:]}") from None
+
+    def rows(self):
+        #Yields (time, {pin: duty}) one row at a time
+        with open(self.filename, "r", newline="") as f:
+            reader = csv.reader(f)
+            pins = self._read_header(reader)
+            for row in reader:
+                if len(row) == 0 or row[0].strip().startswith("#"):
+                    continue
+                try:
+                    timestamp = float(row[0])
+                    updates = {pwm_pin: int(duty_cycle) for pwm_pin, duty_cycle in zip(pins, row[1:]) if duty_cycle.strip()}
+                    if not all([0 <= duty_cycle <= 100 for duty_cycle in updates.values()]):
+                        raise ValueError("duty cycle out of range")
+                except ValueError:
+                    logger.warning("%s line %d ignored: %r", self.filename, reader.line_num, row)
+                    continue
+                yield timestamp, updates
+
+class binary_sequence:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def rows(self):
+        #Yields (time, {pin: duty}), records with the same time grouped into one batch
+        with open(self.filename, "rb") as f:
+            if f.read(len(SEQUENCE_MAGIC)) != SEQUENCE_MAGIC:
+                raise ValueError(f"{self.filename} is not a PWM sequence file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                batch_time, updates = None, {}
+                last_offset = len(data) - SEQUENCE_RECORD.size
+                for offset in range(len(SEQUENCE_MAGIC), last_offset + 1, SEQUENCE_RECORD.size):
+                    timestamp, pwm_pin, duty_cycle = SEQUENCE_RECORD.unpack_from(data, offset)
+                    if timestamp != batch_time and updates:
+                        yield batch_time, updates
+                        updates = {}
+                    batch_time = timestamp
+                    updates[pwm_pin] = duty_cycle
+                if updates:
+                    yield batch_time, updates
+
+def open_sequence(filename):
+    #Picks the reader from the file's first bytes
+    with open(filename, "rb") as f:
+        binary = f.read(len(SEQUENCE_MAGIC)) == SEQUENCE_MAGIC
+    return binary_sequence(filename) if binary else csv_sequence(filename)
+
+def write_binary_sequence(filename, rows):
+    #Writes (time, {pin: duty}) rows, eg. csv_sequence(...).rows(), in the binary format. Streams too.
+    with open(filename, "wb") as f:
+        f.write(SEQUENCE_MAGIC)
+        for timestamp, updates in rows:
+            f.write(b"".join([SEQUENCE_RECORD.pack(timestamp, pwm_pin, duty_cycle) for pwm_pin, duty_cycle in updates.items()]))
+
+##### Player #####
+class drift_stats:
+    #Running totals only, so the report costs the same after a minute or after hours
+    def __init__(self):
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.late = 0
+
+    def add(self, drift):
+        self.rows += 1
+        self.total += drift
+        self.max = max(self.max, drift)
+        if drift > LATE_THRESHOLD:
+            self.late += 1
+        PLAYBACK_DRIFT.observe(drift)
+
+    def report(self):
+        return {"rows": self.rows, "avg_ms": 1000*self.total/self.rows if self.rows else 0.0,
+                "max_ms": 1000*self.max, "late": self.late, "late_threshold_ms": 1000*LATE_THRESHOLD}
+
+class sequence_player:
+    def __init__(self, source, send_function, loop=False, on_finished=None):
+        self.source = source               # csv_sequence/binary_sequence, anything with rows()
+        self.send_function = send_function # send_function({pin: duty, ...}), eg. fleet_controller.update_PWM_many
+        self.loop = loop
+        self.on_finished = on_finished     # on_finished(), called on the playback thread at the end (not when looping)
+        self.drift = drift_stats()
+        self._condition = threading.Condition()
+        self._playing = False
+        self._stopped = False
+        self._seek_to = 0.0    # Position the stream has to be reopened at, None while streaming
+        self._origin = 0.0     # time.perf_counter() at which position 0 is due while playing
+        self._paused_at = 0.0  # Position while not playing
+        self._thread = None
+
+    def play(self):
+        #Starts, or resumes from where it was paused
+        with self._condition:
+            if self._playing or self._stopped:
+                return
+            self._origin = time.perf_counter() - self._paused_at
+            self._playing = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def pause(self):
+        with self._condition:
+            if self._playing:
+                self._paused_at = time.perf_counter() - self._origin
+                self._playing = False
+                self._condition.notify()
+
+    def seek(self, position):
+        #position in seconds from the start of the file, works while playing or paused
+        with self._condition:
+            position = max(0.0, position)
+            self._seek_to = self._paused_at = position
+            self._origin = time.perf_counter() - position
+            self._condition.notify()
+
+    def stop(self):
+        #Final, a stopped player cannot be restarted
+        with self._condition:
+            self._stopped = True
+            self._playing = False
+            self._condition.notify()
+
+    def playing(self):
+        return self._playing
+
+    def position(self):
+        with self._condition:
+            return time.perf_counter() - self._origin if self._playing else self._paused_at
+
+    def _run(self):
+        try:
+            self._play()
+        except Exception:
+            #Eg. the file changed or became unreadable mid-playback. Playback ends instead of looking alive.
+            logger.exception("Playback stopped, the schedule could not be played")
+            with self._condition:
+                self._stopped = True
+                self._playing = False
+
+    def _play(self):
+        rows, batch, duration = None, None, 0.0
+        while True:
+            with self._condition:
+                while not self._playing and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                seek_to, self._seek_to = self._seek_to, None
+                if seek_to is None and batch is not None:
+                    due = self._origin + batch[0]
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        self._condition.wait(wait) # Woken early by pause(), seek() or stop()
+                        continue
+            if seek_to is not None:
+                rows, batch = self._open_at(seek_to)
+                continue
+            if batch is None:
+                self._finished(duration)
+                continue
+            self.send_function(batch[1])
+            self.drift.add(max(0.0, time.perf_counter() - due))
+            PLAYBACK_ROWS.inc()
+            duration = batch[0]
+            batch = next(rows, None)
+
+    def _open_at(self, position):
+        #Restarts the stream and sends the state at position, returns (rows, first batch due at or after position)
+        rows = self.source.rows()
+        state = {}
+        for timestamp, updates in rows:
+            if timestamp >= position:
+                if state:
+                    self.send_function(state)
+                return rows, (timestamp, updates)
+            state.update(updates)
+        if state:
+            self.send_function(state)
+        return rows, None
+
+    def _finished(self, duration):
+        logger.info("Playback reached the end, drift: %s", self.drift.report())
+        with self._condition:
+            if self._seek_to is not None:
+                return # seek() arrived meanwhile
+            self._seek_to = self._paused_at = 0.0
+            if self.loop and duration > 0:
+                self._origin += duration # The next pass is scheduled right after this one, no gap or drift
+                return
+            self._playing = False
+        if self.on_finished is not None:
+            self.on_finished()
+
+def main():
+    from PWM_Transport import udp_transport
+    from PWM_Fleet import fleet_controller
+    from PWM_Config import parse_device_list
+    from PWM_Logging import setup_logging
+    parser = argparse.ArgumentParser(description="Play a timed duty cycle schedule to PWM controllers.")
+    parser.add_argument("filename", help="CSV or binary schedule")
+    parser.add_argument("--ip", default="192.168.0.132", help="device address")
+    parser.add_argument("--port", type=int, default=5000, help="device port")
+    parser.add_argument("--devices", default="", help="several devices, same format as devices= in config.txt")
+    parser.add_argument("--binary", action="store_true", help="use the binary wire format if the devices offer it")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the schedule to start at")
+    parser.add_argument("--loop", action="store_true", help="start over at the end")
+    parser.add_argument("--convert", metavar="OUTPUT", help="write the schedule in the binary format instead of playing it")
+    args = parser.parse_args()
+    setup_logging()
+
+    source = open_sequence(args.filename)
+    if args.convert:
+        write_binary_sequence(args.convert, source.rows())
+        print(f"Wrote {args.convert}")
+        return
+
+    transport = udp_transport(timeout=2)
+    fleet = fleet_controller(transport, parse_device_list(args.devices) or [(args.ip, args.port)], args.binary)
+    fleet.request_config_all().result() # Negotiates the wire format, playback carries on either way
+    finished = threading.Event()
+    player = sequence_player(source, fleet.update_PWM_many, loop=args.loop, on_finished=finished.set)
+    player.seek(args.start)
+    player.play()
+    try:
+        finished.wait()
+    except KeyboardInterrupt:
+        player.stop()
+    print(f"Drift: {player.drift.report()}")
+
+if __name__ == '__main__':
+    main()
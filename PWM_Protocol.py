@@ -0,0 +1,195 @@
+#############################################################
+#                    PWM Wire Protocol                      #
+#############################################################
+#region
+# Description: message formats shared by the UI, the
+# transport and anything else that talks to Arduino_PWM.
+#
+# Date modified: 18/10/2026
+#
+# Message formats (UTF-8 text):
+#   !PING               -> acknowledged
+#   !PING_test          -> acknowledged_test
+#   !REQUEST_CONFIG     -> 3_0|5_0|6_0|9_0
+#   <pin>_<duty>        -> updated
+#   <pin>_<duty>|<pin>_<duty>|...  -> updated (batch, applied together)
+#
+#   Firmware that understands the binary format below adds a
+#   BIN capability entry to its config reply, eg.
+#   "3_0|5_0|6_0|9_0|BIN".
+#
+# Sequence numbers (optional):
+#   Any message may be prefixed with #<seq>: eg. "#17:3_50".
+#   The device echoes the same prefix on its reply, eg.
+#   "#17:updated", so the client can route every reply to
+#   the request that caused it and drop stale ones.
+#
+# Binary format (opt-in, negotiated via the BIN capability):
+#   opcode (1 byte) | seq (2 bytes) | count (1 byte) |
+#   count x [pin (1 byte) | duty (1 byte)], big-endian.
+#   Opcodes are all >= 0x80 so a binary frame can never be
+#   mistaken for a text message. The reply uses the matching
+#   reply opcode and echoes seq. seq 0 means the frame is not
+#   sequenced, sequence numbers themselves start at 1.
+#
+#############################################################
+#endregion
+
+import struct
+from collections import namedtuple
+
+PING_MESSAGE           = "!PING"
+PING_TEST_MESSAGE      = "!PING_test"
+REQUEST_CONFIG_MESSAGE = "!REQUEST_CONFIG"
+
+PING_REPLY      = "acknowledged"
+PING_TEST_REPLY = "acknowledged_test"
+UPDATE_REPLY    = "updated"
+
+SEQ_PREFIX    = b"#"
+SEQ_SEPARATOR = b":"
+SEQ_MODULO    = 65536 # Sequence numbers wrap at 16 bits
+
+BINARY_CAPABILITY = "BIN"
+
+# Binary opcodes, requests:
+OP_PING           = 0x81
+OP_PING_TEST      = 0x82
+OP_REQUEST_CONFIG = 0x83
+OP_UPDATE         = 0x84
+# Binary opcodes, replies:
+OP_ACK            = 0xC1
+OP_ACK_TEST       = 0xC2
+OP_CONFIG         = 0xC3
+OP_UPDATED        = 0xC4
+
+BINARY_OPCODE_MIN = 0x80
+BINARY_HEADER = struct.Struct("!BHB") # opcode, seq, count
+BINARY_RECORD = struct.Struct("!BB")  # pin, duty
+
+COMMAND_OPCODES = {PING_MESSAGE: OP_PING, PING_TEST_MESSAGE: OP_PING_TEST, REQUEST_CONFIG_MESSAGE: OP_REQUEST_CONFIG}
+COMMAND_REPLIES = {PING_MESSAGE: PING_REPLY, PING_TEST_MESSAGE: PING_TEST_REPLY}
+REPLY_OPCODES   = {OP_PING: OP_ACK, OP_PING_TEST: OP_ACK_TEST, OP_REQUEST_CONFIG: OP_CONFIG, OP_UPDATE: OP_UPDATED}
+
+# Parsed !REQUEST_CONFIG reply
+channel_config = namedtuple("channel_config", ["pin", "duty_cycle"])
+config_reply   = namedtuple("config_reply", ["channels", "capabilities"])
+
+_PIPE       = ord("|")
+_UNDERSCORE = ord("_")
+_ZERO       = ord("0")
+_NINE       = ord("9")
+
+def build_update(pwm_pin, duty_cycle):
+    return f"{pwm_pin}_{duty_cycle}"
+
+def build_update_many(updates):
+    #{pin: duty, ...} -> "3_50|5_20|6_0|9_100", the same layout as the !REQUEST_CONFIG reply
+    return "|".join([build_update(pwm_pin, duty_cycle) for pwm_pin, duty_cycle in updates.items()])
+
+def encode_command(command, binary=False):
+    #Encodes one of the fixed commands (PING_MESSAGE, PING_TEST_MESSAGE, REQUEST_CONFIG_MESSAGE)
+    if binary:
+        return encode_binary(COMMAND_OPCODES[command])
+    return command.encode()
+
+def encode_updates(updates, binary=False):
+    #Encodes {pin: duty, ...} as one packet in either wire format
+    if binary:
+        return encode_binary(OP_UPDATE, records=[(int(pwm_pin), duty_cycle) for pwm_pin, duty_cycle in updates.items()])
+    return build_update_many(updates).encode()
+
+##### Binary codec #####
+def is_binary(data):
+    return len(data) > 0 and data[0] >= BINARY_OPCODE_MIN
+
+def encode_binary(opcode, seq=0, records=()):
+    #records is a sequence of (pin, duty) pairs
+    frame = bytearray(BINARY_HEADER.size + BINARY_RECORD.size*len(records))
+    BINARY_HEADER.pack_into(frame, 0, opcode, seq, len(records))
+    offset = BINARY_HEADER.size
+    for pwm_pin, duty_cycle in records:
+        BINARY_RECORD.pack_into(frame, offset, pwm_pin, duty_cycle)
+        offset += BINARY_RECORD.size
+    return bytes(frame)
+
+def decode_binary(data):
+    #Returns (opcode, seq, [(pin, duty), ...]). Raises ValueError on a truncated frame.
+    if len(data) < BINARY_HEADER.size:
+        raise ValueError(f"Binary frame too short ({len(data)} bytes)")
+    opcode, seq, count = BINARY_HEADER.unpack_from(data, 0)
+    if len(data) < BINARY_HEADER.size + BINARY_RECORD.size*count:
+        raise ValueError(f"Binary frame truncated, expected {count} records")
+    records = [BINARY_RECORD.unpack_from(data, BINARY_HEADER.size + BINARY_RECORD.size*i) for i in range(count)]
+    return opcode, seq, records
+
+##### Config reply parser #####
+def parse_config_reply(data):
+    #Parses a !REQUEST_CONFIG reply straight from the received bytes in a single pass:
+    #b"3_50|5_20|6_0|9_0|BIN" -> config_reply([channel_config(3, 50), ...], ["BIN"])
+    #Works for any number of channels. Entries without digits are capability flags.
+    #Binary OP_CONFIG frames are accepted too. Raises ValueError on a malformed entry.
+    if is_binary(data):
+        opcode, seq, records = decode_binary(data)
+        return config_reply([channel_config(pin, duty) for pin, duty in records], [])
+    view = memoryview(data)
+    channels = []
+    capabilities = []
+    entry_start = 0
+    pin = 0
+    duty_cycle = 0
+    field = 0           # 0 while reading the pin, 1 after the '_'
+    digits = [0, 0]     # digits seen in each field
+    other = False       # entry contains something that is not a digit or '_'
+    length = len(view)
+    for index in range(length + 1):
+        byte = view[index] if index < length else _PIPE # Treat the end of the buffer as a final '|'
+        if byte == _PIPE:
+            if index > entry_start:
+                if other:
+                    if digits[0] or digits[1] or field:
+                        raise ValueError(f"Malformed config entry {bytes(view[entry_start:index])!r}")
+                    capabilities.append(bytes(view[entry_start:index]).decode())
+                elif field == 1 and digits[0] and digits[1]:
+                    channels.append(channel_config(pin, duty_cycle))
+                else:
+                    raise ValueError(f"Malformed config entry {bytes(view[entry_start:index])!r}")
+            entry_start = index + 1
+            pin = duty_cycle = field = 0
+            digits[0] = digits[1] = 0
+            other = False
+        elif _ZERO <= byte <= _NINE:
+            digits[field] += 1
+            if field == 0:
+                pin = pin*10 + (byte - _ZERO)
+            else:
+                duty_cycle = duty_cycle*10 + (byte - _ZERO)
+        elif byte == _UNDERSCORE and field == 0:
+            field = 1
+        else:
+            other = True
+    return config_reply(channels, capabilities)
+
+##### Sequence numbers #####
+def add_sequence(message, seq):
+    #Tags an encoded message with its sequence number: b"3_50" -> b"#17:3_50".
+    #Binary frames already have a seq field, it is filled in instead.
+    if is_binary(message):
+        frame = bytearray(message)
+        struct.pack_into("!H", frame, 1, seq)
+        return bytes(frame)
+    return SEQ_PREFIX + str(seq).encode() + SEQ_SEPARATOR + message
+
+def split_sequence(data):
+    #Returns (seq, payload). seq is None for replies without a (valid) sequence prefix,
+    #which is what older firmware sends. Binary frames are returned whole with their seq field.
+    if is_binary(data):
+        if len(data) < BINARY_HEADER.size:
+            return None, data
+        return struct.unpack_from("!H", data, 1)[0], data
+    if not data.startswith(SEQ_PREFIX):
+        return None, data
+    end = data.find(SEQ_SEPARATOR, 1)
+    if end == -1 or not data[1:end].isdigit():
+        return None, data
+    return int(data[1:end]), data[end+1:]
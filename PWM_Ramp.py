@@ -0,0 +1,182 @@
+#############################################################
+#                    PWM Fade/Ramp Engine                   #
+#############################################################
+#region
+# Description: timed duty cycle transitions, eg. 0 -> 80%
+# over 3 s with an ease-in curve. Each ramp is worked out in
+# full when it starts: the curve is sampled once per tick and
+# reduced to the ticks where the whole-percent duty cycle
+# actually changes. A background thread then only has to
+# look up where each ramp is and send the values that moved,
+# one packet per device per tick for all its ramps.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   The tick schedule is fixed to the ramp engine's start
+#       time (tick k is due at start + k/tick_hz), so sleep
+#       overshoot never accumulates. Ticks that are missed
+#       entirely are skipped and counted, a ramp's position
+#       always comes from the clock, never from a tick count,
+#       so a late tick catches up instead of stretching the
+#       ramp.
+#   -   Samples are stored in array('B')/array('L') instead of
+#       numpy arrays, numpy is not a dependency of this
+#       project and a ramp is at most a few thousand samples.
+#   -   start(), cancel() and cancel_all() are thread-safe.
+#       send_function and on_change are called on the ramp
+#       thread, on_change must not touch Tk widgets directly
+#       (use PWM_UIQueue).
+#
+#############################################################
+#endregion
+
+import logging
+import threading
+import time
+from array import array
+from PWM_Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TICK_HZ = 100 # Ramp resolution, a 100% ramp needs at most 100 sends however short the tick
+
+# Curve shapes, progress t in [0, 1] -> fraction of the change done in [0, 1]
+CURVES = {
+    "linear":      lambda t: t,
+    "ease_in":     lambda t: t*t,
+    "ease_out":    lambda t: 1 - (1 - t)*(1 - t),
+    "ease_in_out": lambda t: t*t*(3 - 2*t),
+    "exponential": lambda t: (2**(10*t) - 1) / 1023,
+}
+
+# Metrics (see PWM_Metrics)
+ACTIVE_RAMPS = metrics.gauge("pwm_ramp_active", "Ramps in progress")
+RAMP_SENDS   = metrics.counter("pwm_ramp_values_sent_total", "Duty cycle values sent by ramps")
+LATE_TICKS   = metrics.counter("pwm_ramp_ticks_skipped_total", "Ramp ticks skipped because the thread was late")
+
+def ramp_changes(start, target, duration, curve="linear", tick_hz=TICK_HZ):
+    #Returns (ticks, values): values[i] is the duty cycle from tick ticks[i] on. Only ticks where the
+    #rounded duty cycle changes are kept, the last entry is always the target.
+    if curve not in CURVES:
+        raise ValueError(f"unknown curve {curve!r}, expected one of {', '.join(CURVES)}")
+    shape = CURVES[curve]
+    steps = max(1, round(duration*tick_hz))
+    span = target - start
+    ticks, values = array("L", [0]), array("B", [start])
+    for tick in range(1, steps + 1):
+        value = round(start + span*shape(tick/steps))
+        if value != values[-1]:
+            ticks.append(tick)
+            values.append(value)
+    if values[-1] != target: # Curves end at exactly 1, but never leave a rounding gap at the end
+        ticks.append(steps)
+        values.append(target)
+    return ticks, values
+
+class ramp:
+    def __init__(self, pwm_pin, send_function, ticks, values, start_time, on_done=None):
+        self.pwm_pin = pwm_pin
+        self.send_function = send_function
+        self.ticks = ticks
+        self.values = values
+        self.start_time = start_time # time.perf_counter() of tick 0
+        self.on_done = on_done       # on_done(pwm_pin), called on the ramp thread once the target is sent
+        self.position = -1           # Index into ticks/values of the last value sent
+
+    def advance(self, tick):
+        #Returns the value to send for this tick, or None if it has not changed since the last send
+        position = self.position
+        while position + 1 < len(self.ticks) and self.ticks[position + 1] <= tick:
+            position += 1
+        if position == self.position:
+            return None
+        self.position = position
+        return self.values[position]
+
+    def finished(self):
+        return self.position == len(self.ticks) - 1
+
+class ramp_engine:
+    def __init__(self, send_function, tick_hz=TICK_HZ, on_change=None):
+        self.send_function = send_function # Default destination, send_function({pin: duty, ...})
+        self.tick_hz = tick_hz
+        self.on_change = on_change         # on_change(pwm_pin, duty_cycle) after each value sent
+        self._ramps = {}                   # (send_function, pin) -> ramp
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, pwm_pin, start, target, duration, curve="linear", send_function=None, on_done=None):
+        #Ramps pwm_pin from start to target over duration seconds. A ramp already running on the
+        #same pin and destination is replaced. Raises ValueError for an unknown curve.
+        send_function = send_function or self.send_function
+        ticks, values = ramp_changes(start, target, duration, curve, self.tick_hz)
+        with self._condition:
+            self._ramps[(send_function, pwm_pin)] = ramp(pwm_pin, send_function, ticks, values, time.perf_counter(), on_done)
+            ACTIVE_RAMPS.set(len(self._ramps))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        logger.debug("Ramp pin %s %s -> %s over %.2f s (%s), %d sends", pwm_pin, start, target, duration, curve, len(values))
+
+    def cancel(self, pwm_pin, send_function=None):
+        #Stops a ramp where it is. Returns True if one was running.
+        with self._condition:
+            cancelled = self._ramps.pop((send_function or self.send_function, pwm_pin), None) is not None
+            ACTIVE_RAMPS.set(len(self._ramps))
+        return cancelled
+
+    def cancel_all(self):
+        with self._condition:
+            self._ramps.clear()
+            ACTIVE_RAMPS.set(0)
+
+    def active_count(self):
+        return len(self._ramps)
+
+    def _run(self):
+        period = 1.0 / self.tick_hz
+        next_tick = time.perf_counter()
+        while True:
+            with self._condition:
+                if len(self._ramps) == 0:
+                    while len(self._ramps) == 0:
+                        self._condition.wait()
+                    next_tick = time.perf_counter() # Idle time is not counted as late ticks
+                wait = next_tick - time.perf_counter()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+            missed = int(-wait*self.tick_hz)
+            if missed > 0:
+                LATE_TICKS.inc(missed)
+            next_tick += (missed + 1)*period
+            self._tick(time.perf_counter())
+
+    def _tick(self, now):
+        batches = {} # send_function -> {pin: duty}
+        finished = []
+        with self._condition:
+            for key, active_ramp in list(self._ramps.items()):
+                value = active_ramp.advance(int((now - active_ramp.start_time)*self.tick_hz))
+                if value is not None:
+                    batches.setdefault(active_ramp.send_function, {})[active_ramp.pwm_pin] = value
+                if active_ramp.finished():
+                    del self._ramps[key]
+                    finished.append(active_ramp)
+            ACTIVE_RAMPS.set(len(self._ramps))
+        #Sent outside the lock so a slow send_function never blocks start() on the Tk thread
+        for send_function, updates in batches.items():
+            try:
+                send_function(updates)
+            except Exception:
+                logger.exception("Ramp send to %s failed", send_function)
+                continue
+            RAMP_SENDS.inc(len(updates))
+            if self.on_change is not None:
+                for pwm_pin, duty_cycle in updates.items():
+                    self.on_change(pwm_pin, duty_cycle)
+        for done_ramp in finished:
+            if done_ramp.on_done is not None:
+                done_ramp.on_done(done_ramp.pwm_pin)
@@ -0,0 +1,120 @@
+#############################################################
+#               PWM Reliable Update Delivery                #
+#############################################################
+#region
+# Description: optional acknowledged delivery of PWM updates.
+# Every update is sent as a request and retransmitted until
+# the device answers "updated" (OP_UPDATED in binary) or the
+# retry budget runs out. Only the newest value per pin
+# matters, so a newer update for a pin takes that pin out of
+# any older update still waiting to be retransmitted. The new
+# value goes out straight away instead of queueing behind the
+# old one.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Needs sequence numbers (transport.use_sequence) so
+#       each "updated" reply can be tied to the update it
+#       acknowledges. main() switches them on for this mode.
+#   -   Every attempt of an update carries the same sequence
+#       number, so an acknowledgement of any attempt completes
+#       it, and the firmware (which remembers the last few
+#       update sequence numbers) acknowledges a retransmit it
+#       has already applied without applying it again.
+#   -   The wait before a retransmit is the device's RTO as
+#       measured by PWM_Heartbeat (retry_timeout until the
+#       first ping), doubled on each retransmit.
+#   -   submit() is thread-safe, the retransmit timers run on
+#       the transport loop.
+#
+#############################################################
+#endregion
+
+import asyncio
+import logging
+import socket
+from PWM_Metrics import metrics
+from PWM_Transport import update_matcher
+from PWM_Protocol import encode_updates
+from PWM_Logging import HOT_PATH
+
+logger = logging.getLogger(__name__)
+
+RETRY_TIMEOUT     = 0.25 # Seconds to wait for an acknowledgement before retransmitting, until the RTO is measured
+MAX_RETRY_TIMEOUT = 2.0  # Backoff limit, same as the transport's default timeout
+MAX_RETRIES       = 4    # Retransmits per update before giving up on it
+
+# Metrics (see PWM_Metrics), totals across every device
+RETRANSMITS  = metrics.counter("pwm_reliable_retransmits_total", "Update retransmits")
+FAILED       = metrics.counter("pwm_reliable_failed_total", "Updates given up on after MAX_RETRIES")
+SUPERSEDED   = metrics.counter("pwm_reliable_superseded_total", "Pending pin updates replaced by a newer value")
+PENDING_PINS = metrics.gauge("pwm_reliable_pending_pins", "Pins with an update not acknowledged yet")
+
+class reliable_sender:
+    def __init__(self, device, retry_timeout=RETRY_TIMEOUT, max_retries=MAX_RETRIES):
+        self.device = device # device_connection the updates are for
+        self.retry_timeout = retry_timeout
+        self.max_retries = max_retries
+        self._owner = {} # pin -> the update dict currently responsible for delivering that pin
+        self.counters = {"sent": 0, "acknowledged": 0, "retransmits": 0, "superseded": 0, "failed": 0}
+
+    def submit(self, updates):
+        #Thread-safe. {pin: duty, ...} is delivered as one packet, retransmitted until acknowledged.
+        self.device.transport.loop.call_soon_threadsafe(self._submit, dict(updates))
+
+    def pending_count(self):
+        #Pins with an update that has not been acknowledged yet
+        return len(self._owner)
+
+    def _submit(self, updates):
+        for pwm_pin in updates:
+            if pwm_pin in self._owner:
+                self.counters["superseded"] += 1
+                SUPERSEDED.inc()
+            else:
+                PENDING_PINS.inc()
+            self._owner[pwm_pin] = updates
+        asyncio.ensure_future(self._deliver(updates))
+
+    def _live(self, updates):
+        #The part of an update that has not been superseded by a newer one
+        return {pwm_pin: duty_cycle for pwm_pin, duty_cycle in updates.items() if self._owner.get(pwm_pin) is updates}
+
+    def _release(self, updates):
+        for pwm_pin in updates:
+            if self._owner.get(pwm_pin) is updates:
+                del self._owner[pwm_pin]
+                PENDING_PINS.dec()
+
+    async def _deliver(self, updates):
+        device = self.device
+        seq = device.transport.new_sequence() # Shared by every attempt
+        timeout = device.rtt.rto if device.rtt is not None else self.retry_timeout
+        for attempt in range(self.max_retries + 1):
+            live = self._live(updates)
+            if len(live) == 0:
+                return # Every pin was superseded, nothing left to deliver
+            if attempt == 0:
+                self.counters["sent"] += 1
+            else:
+                self.counters["retransmits"] += 1
+                RETRANSMITS.inc()
+            try:
+                #Unless a pin was superseded meanwhile this is the same packet every time. A smaller one under
+                #the same number is still safe: if the device has that number, it applied these values already.
+                await device.transport.request_async(encode_updates(live, device.binary_protocol), device.address,
+                    update_matcher(device.binary_protocol), timeout, seq)
+                self.counters["acknowledged"] += 1
+                device.shadow.confirm(live)
+                self._release(updates)
+                return
+            except socket.timeout:
+                timeout = min(timeout*2, MAX_RETRY_TIMEOUT)
+        live = self._live(updates)
+        self._release(updates)
+        if len(live) > 0:
+            self.counters["failed"] += 1
+            FAILED.inc()
+            logger.error("Update %s to %s was not acknowledged after %d retransmits.", live, device.address,
+                self.max_retries, extra=HOT_PATH)
@@ -0,0 +1,100 @@
+#############################################################
+#                        PWM Scenes                         #
+#############################################################
+#region
+# Description: named duty cycle presets. A scene is saved
+# from the current channel values and recalled in one
+# action: only the channels whose value differs from what
+# was last sent go out, all in a single packet per device.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Every channel of a scene is encoded once when the
+#       scene is created, in both wire formats. A recall only
+#       joins the pre-encoded pieces of the channels that
+#       changed, nothing is formatted on the hot path.
+#   -   Scenes are kept in scenes.txt, one per line in the
+#       same layout as last_duty_cycles, eg.
+#       "evening=3:20,5:20,6:0,9:60". The file is rewritten
+#       atomically with PWM_Persistence.write_settings().
+#   -   Pins are ints, like last_duty_cycles in PWM_Config.
+#
+#############################################################
+#endregion
+
+import logging
+from PWM_Config import parse_duty_cycles, format_duty_cycles
+from PWM_Persistence import write_settings
+from PWM_Protocol import build_update, BINARY_HEADER, BINARY_RECORD, OP_UPDATE
+
+logger = logging.getLogger(__name__)
+
+SCENES_FILENAME = "scenes.txt"
+
+class scene:
+    def __init__(self, name, duty_cycles):
+        self.name = name
+        #Raises ValueError for a duty cycle outside 0-100, the same range update_PWM enforces
+        self.duty_cycles = {int(pwm_pin): int(duty_cycle) for pwm_pin, duty_cycle in duty_cycles.items()}
+        for pwm_pin, duty_cycle in self.duty_cycles.items():
+            if not 0 <= duty_cycle <= 100:
+                raise ValueError(f"scene {name!r}: duty cycle {duty_cycle} for pin {pwm_pin} is not between 0 and 100")
+        #Pre-encoded per channel: "3_50" for text, the 2-byte (pin, duty) record for binary
+        self._text   = {pwm_pin: build_update(pwm_pin, duty_cycle).encode() for pwm_pin, duty_cycle in self.duty_cycles.items()}
+        self._binary = {pwm_pin: BINARY_RECORD.pack(pwm_pin, duty_cycle) for pwm_pin, duty_cycle in self.duty_cycles.items()}
+        self._full   = {False: self._join(False, self.duty_cycles), True: self._join(True, self.duty_cycles)}
+
+    def changed_pins(self, last_known):
+        #Pins whose scene value differs from last_known ({pin: duty}), in scene order
+        return [pwm_pin for pwm_pin, duty_cycle in self.duty_cycles.items() if last_known.get(pwm_pin) != duty_cycle]
+
+    def payload(self, binary, pins=None):
+        #One update packet for pins (every channel if None), byte for byte what encode_updates() would build
+        if pins is None or len(pins) == len(self.duty_cycles):
+            return self._full[binary]
+        return self._join(binary, pins)
+
+    def _join(self, binary, pins):
+        if binary:
+            return BINARY_HEADER.pack(OP_UPDATE, 0, len(pins)) + b"".join([self._binary[pwm_pin] for pwm_pin in pins])
+        return b"|".join([self._text[pwm_pin] for pwm_pin in pins])
+
+class scene_library:
+    def __init__(self, filename=SCENES_FILENAME):
+        self.filename = filename
+        self.scenes = {} # name -> scene, in file order
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, "r") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            name, separator, value = line.partition("=")
+            if not separator or value.strip() == "":
+                continue # Blank value: a deleted scene
+            try:
+                self.scenes[name.strip()] = scene(name.strip(), parse_duty_cycles(value))
+            except ValueError as e:
+                logger.warning("Scene %r in %s ignored, could not use %r: %s", name.strip(), self.filename, value, e)
+
+    def names(self):
+        return list(self.scenes)
+
+    def get(self, name):
+        return self.scenes.get(name)
+
+    def save(self, name, duty_cycles):
+        #Adds or replaces a scene and writes it to the file. Returns the new scene.
+        if name == "" or "=" in name or "//" in name:
+            raise ValueError(f"{name!r} cannot be used as a scene name")
+        self.scenes[name] = scene(name, duty_cycles)
+        write_settings(self.filename, {name: format_duty_cycles(self.scenes[name].duty_cycles)})
+        return self.scenes[name]
+
+    def delete(self, name):
+        if self.scenes.pop(name, None) is not None:
+            write_settings(self.filename, {name: ""})
@@ -0,0 +1,72 @@
+#############################################################
+#                    PWM Shadow State                       #
+#############################################################
+#region
+# Description: client-side copy of one device's duty cycles.
+# commanded holds what the UI last asked for, confirmed what
+# the device is known to have (from a config reply or an
+# acknowledged update). Updates that would not change the
+# device are not sent, and after the link comes back only
+# the channels where the two differ are pushed, in one
+# packet, instead of reloading the device's config over the
+# operator's changes.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Pins are ints, like last_duty_cycles in PWM_Config.
+#   -   Fire-and-forget updates are never confirmed, so they
+#       are only skipped once a config reply or an
+#       acknowledgement has shown the device holds the value.
+#   -   seed() restores commanded values saved by a previous
+#       run without touching the network, they are pushed
+#       once the device's config shows they are missing.
+#   -   Thread-safe, updates come from the Tk, ramp and
+#       playback threads and confirmations from the
+#       transport loop.
+#
+#############################################################
+#endregion
+
+import threading
+
+class shadow_state:
+    def __init__(self):
+        self.commanded = {} # pin -> duty cycle last sent, or to be sent
+        self.confirmed = {} # pin -> duty cycle the device is known to have
+        self._lock = threading.Lock()
+
+    def command(self, updates):
+        #Records {pin: duty} as commanded and returns the part that has to be sent. A value is only
+        #skipped if it was already commanded and confirmed, so it can never race an update still in flight.
+        with self._lock:
+            needed = {}
+            for pwm_pin, duty_cycle in updates.items():
+                previous = self.commanded.get(int(pwm_pin))
+                self.commanded[int(pwm_pin)] = duty_cycle
+                if previous != duty_cycle or self.confirmed.get(int(pwm_pin)) != duty_cycle:
+                    needed[pwm_pin] = duty_cycle
+            return needed
+
+    def seed(self, duty_cycles):
+        #Commanded values from a previous run, nothing is sent
+        with self._lock:
+            for pwm_pin, duty_cycle in duty_cycles.items():
+                self.commanded.setdefault(int(pwm_pin), duty_cycle)
+
+    def confirm(self, updates):
+        #The device acknowledged {pin: duty}
+        with self._lock:
+            for pwm_pin, duty_cycle in updates.items():
+                self.confirmed[int(pwm_pin)] = duty_cycle
+
+    def replace_confirmed(self, channels):
+        #A config reply lists every channel, whatever was confirmed before is out of date
+        with self._lock:
+            self.confirmed = {int(config.pin): config.duty_cycle for config in channels}
+
+    def diverged(self):
+        #{pin: duty} commanded but not confirmed, only for pins the device is known to have
+        with self._lock:
+            return {pwm_pin: duty_cycle for pwm_pin, duty_cycle in self.commanded.items()
+                    if pwm_pin in self.confirmed and self.confirmed[pwm_pin] != duty_cycle}
@@ -0,0 +1,221 @@
+#############################################################
+#                  PWM Device Simulator                     #
+#############################################################
+#region
+# Description: stand-in for Arduino_PWM.ino that runs on a
+# PC. Each simulated device listens on its own UDP port and
+# answers !PING, !PING_test, !REQUEST_CONFIG and PWM updates
+# (text or binary, with or without sequence numbers) with
+# the same replies as the sketch. Network conditions can be
+# simulated per device: latency, jitter, loss and reordering.
+# Any number of devices can run in one process, so the UI,
+# fleet mode and benchmarks can be exercised without
+# hardware.
+#
+# Date modified: 18/10/2026
+#
+# Usage:
+#   python PWM_Simulator.py --devices 4 --port 5000
+#   then set devices= in config.txt to the printed list.
+#
+# Notes:
+#   -   Latency delays handling of each packet (the update
+#       is applied late, as if the packet were in flight),
+#       loss drops requests and replies independently.
+#   -   Reordered packets are held back for an extra
+#       REORDER_DELAY so later packets overtake them.
+#   -   Like the sketch, updates for unknown pins are
+#       ignored and duty cycles are stored as a byte.
+#
+#############################################################
+#endregion
+
+import argparse
+import asyncio
+import random
+import threading
+from PWM_Protocol import PING_MESSAGE, PING_TEST_MESSAGE, REQUEST_CONFIG_MESSAGE, PING_REPLY, PING_TEST_REPLY, \
+    UPDATE_REPLY, BINARY_CAPABILITY, OP_PING, OP_PING_TEST, OP_REQUEST_CONFIG, OP_UPDATE, REPLY_OPCODES, \
+    SEQ_PREFIX, SEQ_SEPARATOR, is_binary, encode_binary, decode_binary, split_sequence
+
+DEFAULT_PINS   = [3, 5, 6, 9] # Same as pin0..pin3 in the sketch
+RECENT_UPDATES = 8            # Update sequence numbers remembered for deduplication, as in the sketch
+REORDER_DELAY  = 0.02         # Seconds a reordered packet is held back
+
+def simulated_pins(channels):
+    #The sketch's four pins, then further pins numbered from 10 for bigger simulated boards
+    return (DEFAULT_PINS + list(range(10, 10 + max(0, channels - len(DEFAULT_PINS)))))[:channels]
+
+class simulated_device(asyncio.DatagramProtocol):
+    def __init__(self, channels=4, latency=0.0, jitter=0.0, loss=0.0, reorder=0.0, binary=True, seed=None):
+        self.pins = simulated_pins(channels)
+        self.duty_cycles = {pwm_pin: 0 for pwm_pin in self.pins}
+        self.latency = latency  # Seconds added before each packet is handled
+        self.jitter = jitter    # Up to this many extra seconds, uniformly distributed
+        self.loss = loss        # Probability of dropping a request, and separately its reply
+        self.reorder = reorder  # Probability of holding a packet back so later ones overtake it
+        self.binary = binary    # Advertise the BIN capability
+        self.random = random.Random(seed)
+        self.recent_updates = []
+        self.counters = {"received": 0, "dropped": 0, "replied": 0, "updates": 0, "duplicates": 0}
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.counters["received"] += 1
+        if self.random.random() < self.loss:
+            self.counters["dropped"] += 1
+            return
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if self.random.random() < self.reorder:
+            delay += REORDER_DELAY
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._handle, data, addr)
+        else:
+            self._handle(data, addr)
+
+    def _handle(self, data, addr):
+        reply = self._handle_binary(data) if is_binary(data) else self._handle_text(data)
+        if reply is None:
+            return
+        if self.random.random() < self.loss:
+            self.counters["dropped"] += 1
+            return
+        self.counters["replied"] += 1
+        self.transport.sendto(reply, addr)
+
+    def _handle_text(self, data):
+        seq, command = split_sequence(data)
+        prefix = b"" if seq is None else SEQ_PREFIX + str(seq).encode() + SEQ_SEPARATOR
+        command = command.split(b"\0", 1)[0].decode(errors="replace")
+        if command == PING_MESSAGE:
+            reply = PING_REPLY
+        elif command == PING_TEST_MESSAGE:
+            reply = PING_TEST_REPLY
+        elif command == REQUEST_CONFIG_MESSAGE:
+            reply = self.config_string()
+        else:
+            if seq is None or not self._is_duplicate(seq):
+                for entry in command.split("|"):
+                    pin_text, underscore, duty_text = entry.partition("_")
+                    if underscore:
+                        self._set_duty_cycle(_leading_int(pin_text), _leading_int(duty_text))
+            reply = UPDATE_REPLY
+        return prefix + reply.encode()
+
+    def _handle_binary(self, data):
+        try:
+            opcode, seq, records = decode_binary(data)
+        except ValueError:
+            return None # Frame too short, the sketch ignores it too
+        if opcode == OP_UPDATE:
+            if seq == 0 or not self._is_duplicate(seq):
+                for pwm_pin, duty_cycle in records:
+                    self._set_duty_cycle(pwm_pin, duty_cycle)
+            return encode_binary(REPLY_OPCODES[opcode], seq)
+        if opcode == OP_REQUEST_CONFIG:
+            return encode_binary(REPLY_OPCODES[opcode], seq, list(self.duty_cycles.items()))
+        if opcode in (OP_PING, OP_PING_TEST):
+            return encode_binary(REPLY_OPCODES[opcode], seq)
+        return None # Unknown opcode
+
+    def config_string(self):
+        entries = [f"{pwm_pin}_{duty_cycle}" for pwm_pin, duty_cycle in self.duty_cycles.items()]
+        if self.binary:
+            entries.append(BINARY_CAPABILITY)
+        return "|".join(entries)
+
+    def _set_duty_cycle(self, pwm_pin, duty_cycle):
+        if pwm_pin in self.duty_cycles:
+            self.duty_cycles[pwm_pin] = duty_cycle & 0xFF # uint8_t on the Arduino
+            self.counters["updates"] += 1
+
+    def _is_duplicate(self, seq):
+        if seq in self.recent_updates:
+            self.counters["duplicates"] += 1
+            return True
+        self.recent_updates.append(seq)
+        if len(self.recent_updates) > RECENT_UPDATES:
+            del self.recent_updates[0]
+        return False
+
+def _leading_int(text):
+    #strtol/atoi behaviour: the leading digits, 0 if there are none
+    digits = ""
+    for character in text.strip():
+        if not character.isdigit():
+            break
+        digits += character
+    return int(digits) if digits else 0
+
+class device_simulator:
+    #Runs any number of simulated_devices on an asyncio loop in a daemon thread
+    def __init__(self, host="127.0.0.1"):
+        self.host = host
+        self.devices = {} # (host, port) -> simulated_device
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def add_device(self, port=0, device_class=simulated_device, **settings):
+        #Starts a device, port 0 picks a free one. settings are passed to device_class. Returns its (host, port).
+        return asyncio.run_coroutine_threadsafe(self._add_device(port, device_class, settings), self.loop).result()
+
+    def add_devices(self, count, base_port=0, device_class=simulated_device, **settings):
+        #count devices on consecutive ports from base_port (or free ports if base_port is 0)
+        addresses = []
+        for i in range(count):
+            device_settings = dict(settings)
+            if device_settings.get("seed") is not None:
+                device_settings["seed"] += i # Repeatable, but not the same losses on every device
+            addresses.append(self.add_device(base_port + i if base_port else 0, device_class, **device_settings))
+        return addresses
+
+    async def _add_device(self, port, device_class, settings):
+        transport, device = await self.loop.create_datagram_endpoint(
+            lambda: device_class(**settings), local_addr=(self.host, port))
+        address = transport.get_extra_info("sockname")[:2]
+        self.devices[address] = device
+        return address
+
+    def close(self):
+        def _close():
+            for device in self.devices.values():
+                device.transport.close()
+            self.loop.stop()
+        self.loop.call_soon_threadsafe(_close)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Arduino_PWM devices for testing without hardware.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=5000, help="port of the first device, the rest follow on")
+    parser.add_argument("--devices", type=int, default=1, help="number of simulated devices")
+    parser.add_argument("--channels", type=int, default=4, help="PWM channels per device")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every packet")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random milliseconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability (0-1) of dropping a request or reply")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probability (0-1) of reordering a packet")
+    parser.add_argument("--no-binary", action="store_true", help="do not advertise the binary wire format")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for repeatable runs")
+    args = parser.parse_args()
+
+    simulator = device_simulator(args.host)
+    addresses = simulator.add_devices(args.devices, args.port, channels=args.channels, latency=args.latency/1000,
+        jitter=args.jitter/1000, loss=args.loss, reorder=args.reorder, binary=not args.no_binary, seed=args.seed)
+    print(f"[CONSOLE] {len(addresses)} simulated device(s) running. For config.txt:")
+    print("devices=" + ",".join([f"{host}:{port}" for host, port in addresses]))
+    try:
+        simulator._thread.join()
+    except KeyboardInterrupt:
+        simulator.close()
+        for address, device in simulator.devices.items():
+            print(f"[CONSOLE] {address}: {device.counters}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#############################################################
+#                        PWM Themes                         #
+#############################################################
+#region
+# Description: finds the bundled awthemes next to this file
+# and loads a Tcl theme only when it is first used, so start
+# up sources the selected theme and nothing else.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   register() only tells Tcl where each package is
+#       (package ifneeded), which costs the same no matter how
+#       many themes are bundled. The .tcl file is sourced by
+#       the first use() of that theme.
+#   -   theme_names() lists the bundled themes before they are
+#       loaded, so a theme combobox can offer them all.
+#   -   Native ttk themes (clam, alt, vista, ...) need nothing
+#       loaded and are passed straight to ttk.
+#
+#############################################################
+#endregion
+
+import logging
+import os
+from tkinter import ttk
+
+logger = logging.getLogger(__name__)
+
+THEME_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "awthemes-10.4.0")
+# Tcl package: (version, file). awthemes and colorutils are pulled in by the themes that need them.
+AWTHEMES_PACKAGES = {
+    "awthemes":   ("10.4.0", "awthemes.tcl"),
+    "colorutils": ("4.8", "colorutils.tcl"),
+    "awdark":     ("7.12", "awdark.tcl"),
+    "awlight":    ("7.10", "awlight.tcl"),
+}
+AWTHEMES = ("awdark", "awlight") # Packages that are themes, in the order they are listed
+
+class theme_loader:
+    def __init__(self, widget, directory=THEME_DIRECTORY):
+        self.widget = widget # Any widget of the Tk instance, ttk.Style is per interpreter
+        self.directory = directory
+        self.loaded = set()  # awthemes sourced so far
+        self.register()
+
+    def register(self):
+        #Tells Tcl where the packages are, nothing is sourced here
+        for package, (version, filename) in AWTHEMES_PACKAGES.items():
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                self.widget.tk.call("package", "ifneeded", package, version, ("source", path))
+            else:
+                logger.warning("Theme package %s not found at %s", package, path)
+
+    def theme_names(self):
+        #Native ttk themes plus every bundled theme, loaded or not
+        native = [name for name in ttk.Style(self.widget).theme_names() if name not in AWTHEMES]
+        return native + list(AWTHEMES)
+
+    def load(self, theme_name):
+        #Sources a bundled theme the first time it is needed. Native themes are already there.
+        if theme_name in AWTHEMES and theme_name not in self.loaded:
+            self.widget.tk.call("package", "require", theme_name)
+            self.loaded.add(theme_name)
+            logger.debug("Loaded theme %s", theme_name)
+
+    def use(self, theme_name):
+        #Raises TclError for a theme ttk does not know, like ttk.Style.theme_use()
+        self.load(theme_name)
+        ttk.Style(self.widget).theme_use(theme_name)
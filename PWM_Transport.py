@@ -0,0 +1,246 @@
+#############################################################
+#                      PWM UDP Transport                    #
+#############################################################
+#region
+# Description: a single asyncio-based UDP transport that owns
+# the socket used to talk to the PWM controller. Replies are
+# matched to the request that caused them so that several
+# requests can be in flight at once without one caller
+# reading another caller's reply.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   The asyncio loop runs in its own daemon thread. All
+#       public methods are thread-safe and may be called from
+#       the Tk thread or any worker thread.
+#   -   request() returns a concurrent.futures.Future. Worker
+#       threads may block on .result(), the Tk thread should
+#       use tk_when_done() instead so the UI never blocks.
+#   -   With use_sequence enabled every outgoing message gets
+#       a #<seq>: prefix (see PWM_Protocol). Replies carrying
+#       a sequence number are routed by it, replies without
+#       one (older firmware) fall back to the matcher.
+#
+#############################################################
+#endregion
+
+import asyncio
+import ipaddress
+import logging
+import random
+import socket
+import threading
+import time
+from PWM_Metrics import metrics
+from PWM_Logging import HOT_PATH
+from PWM_Protocol import SEQ_MODULO, add_sequence, split_sequence, is_binary, \
+    REQUEST_CONFIG_MESSAGE, COMMAND_OPCODES, COMMAND_REPLIES, REPLY_OPCODES, UPDATE_REPLY, OP_UPDATED, parse_config_reply
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 2 # Seconds to wait for a reply before giving up, same as the old client.settimeout(2)
+FIXED_REPLIES   = {reply.encode() for reply in list(COMMAND_REPLIES.values()) + [UPDATE_REPLY]}
+
+# Metrics (see PWM_Metrics), free while metrics are disabled
+PACKETS_SENT      = metrics.counter("pwm_packets_sent_total", "Datagrams sent to devices")
+PACKETS_RECEIVED  = metrics.counter("pwm_packets_received_total", "Datagrams received from devices")
+REPLIES_UNMATCHED = metrics.counter("pwm_replies_unmatched_total", "Replies no request was waiting for (late or unsolicited)")
+REQUEST_TIMEOUTS  = metrics.counter("pwm_request_timeouts_total", "Requests that got no matching reply in time")
+REQUEST_RTT       = metrics.histogram("pwm_request_rtt_seconds", "Request to matching reply round-trip time")
+SEND_LATENCY      = metrics.histogram("pwm_send_latency_seconds", "send() call to the datagram leaving the socket")
+PENDING_REQUESTS  = metrics.gauge("pwm_pending_requests", "Requests waiting for a reply")
+
+class udp_protocol(asyncio.DatagramProtocol):
+    #Thin protocol object, hands every datagram to the owning udp_transport
+    def __init__(self, owner):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        #ICMP port unreachable etc. The waiting request will simply time out.
+        logger.warning("Socket error: %s", exc, extra=HOT_PATH)
+
+class udp_transport:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, use_sequence=False):
+        self.timeout = timeout
+        self.use_sequence = use_sequence
+        self.loop = asyncio.new_event_loop()
+        self._transport = None
+        self._next_seq = random.randrange(1, SEQ_MODULO) # Random start so a restarted client does not repeat recent numbers
+        self._pending = {}   # address -> list of [seq, matcher, future], oldest first
+        self._resolved = {}  # cache of hostname -> ip so replies can be matched by address
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self.loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _open(self):
+        self._transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: udp_protocol(self), local_addr=('0.0.0.0', 0))
+
+    def resolve(self, address):
+        #Replies arrive from the numeric ip, so hostnames from config.txt are resolved once and cached
+        host, port = address
+        if host not in self._resolved:
+            try:
+                ipaddress.ip_address(host)
+                self._resolved[host] = host
+            except ValueError:
+                self._resolved[host] = socket.gethostbyname(host)
+        return (self._resolved[host], int(port))
+
+    ##### Public API #####
+    def send(self, message, address):
+        #Fire and forget, used for PWM updates where nobody waits on a reply.
+        #The message is still sequenced so the device's reply can never be mistaken for another one.
+        address = self.resolve(address)
+        queued = time.perf_counter() if metrics.enabled else None
+        self.loop.call_soon_threadsafe(self._send_queued, message, address, queued)
+
+    def request(self, message, address, matcher=None, timeout=None):
+        #Send a message and return a concurrent.futures.Future resolved with the reply bytes.
+        #matcher(reply_bytes) decides which reply belongs to this request. Raises socket.timeout
+        #through the future if nothing matching arrives in time.
+        return self.run(self.request_async(message, address, matcher, timeout))
+
+    async def request_async(self, message, address, matcher=None, timeout=None, seq=None):
+        #Coroutine version of request(), for code already running on the transport loop (see run()).
+        #seq from new_sequence() sends a retransmit under the number of the first attempt, so the device
+        #can recognise it as a duplicate and an answer to any attempt completes the request.
+        address = self.resolve(address)
+        if timeout is None:
+            timeout = self.timeout
+        return await self._request(message, address, matcher, timeout, seq)
+
+    def new_sequence(self):
+        #Reserves a sequence number for request_async(seq=...), None when sequencing is disabled
+        if not self.use_sequence:
+            return None
+        seq = self._next_seq
+        self._next_seq = self._next_seq % (SEQ_MODULO - 1) + 1 # 1..65535, 0 marks an unsequenced binary frame
+        return seq
+
+    def run(self, coroutine):
+        #Schedules a coroutine on the transport loop and returns a concurrent.futures.Future for its result.
+        #Lets callers await several requests at once, eg. asyncio.gather() across many devices.
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self):
+        def _close():
+            if self._transport is not None:
+                self._transport.close()
+            self.loop.stop()
+        self.loop.call_soon_threadsafe(_close)
+
+    ##### Loop-thread internals #####
+    def _sendto(self, message, address):
+        self._transport.sendto(message, address)
+        PACKETS_SENT.inc()
+
+    def _send_queued(self, message, address, queued):
+        self._send_sequenced(message, address)
+        if queued is not None:
+            SEND_LATENCY.observe(time.perf_counter() - queued)
+
+    def _send_sequenced(self, message, address, seq=None):
+        #Returns the sequence number used (a new one unless seq is given), or None when sequencing is disabled
+        if seq is None:
+            seq = self.new_sequence()
+        if seq is None:
+            self._sendto(message, address)
+        else:
+            self._sendto(add_sequence(message, seq), address)
+        return seq
+
+    async def _request(self, message, address, matcher, timeout, seq=None):
+        future = self.loop.create_future()
+        waiter = [None, matcher, future]
+        waiters = self._pending.setdefault(address, [])
+        waiters.append(waiter)
+        PENDING_REQUESTS.inc()
+        start = self.loop.time()
+        waiter[0] = self._send_sequenced(message, address, seq)
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+            REQUEST_RTT.observe(self.loop.time() - start)
+            return reply
+        except asyncio.TimeoutError:
+            REQUEST_TIMEOUTS.inc()
+            raise socket.timeout(f"No reply from {address} within {timeout}s") from None
+        finally:
+            PENDING_REQUESTS.dec()
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    def _on_datagram(self, data, addr):
+        PACKETS_RECEIVED.inc()
+        waiters = self._pending.get(addr[:2], [])
+        seq, payload = split_sequence(data)
+        for waiter in waiters:
+            waiter_seq, matcher, future = waiter
+            if future.done():
+                continue
+            if seq is not None and waiter_seq is not None:
+                #Sequenced reply, only the request with the same number may take it
+                matched = (seq == waiter_seq)
+            else:
+                matched = (matcher is None or matcher(payload))
+            if matched:
+                waiters.remove(waiter)
+                future.set_result(payload)
+                return
+        #Nobody asked for this reply (eg. the device answering a PWM update, or a reply
+        #to a request that already timed out), drop it
+        REPLIES_UNMATCHED.inc()
+
+##### Reply matchers #####
+def reply_equals(expected):
+    expected = expected.encode() if isinstance(expected, str) else expected
+    return lambda data: data == expected
+
+def reply_contains(expected):
+    expected = expected.encode() if isinstance(expected, str) else expected
+    return lambda data: expected in data
+
+def reply_opcode(opcode):
+    return lambda data: is_binary(data) and data[0] == opcode
+
+def reply_config(data):
+    #Only a reply that parses as a channel list, never one of the fixed replies ("acknowledged_test" has a '_' too)
+    if data in FIXED_REPLIES:
+        return False
+    try:
+        parse_config_reply(data)
+    except ValueError:
+        return False
+    return True
+
+def reply_matcher(command, binary=False):
+    #Matcher for the device's reply to one of the fixed commands in PWM_Protocol
+    if binary:
+        return reply_opcode(REPLY_OPCODES[COMMAND_OPCODES[command]])
+    if command == REQUEST_CONFIG_MESSAGE:
+        return reply_config
+    return reply_equals(COMMAND_REPLIES[command])
+
+def update_matcher(binary=False):
+    #Matcher for the device's acknowledgement of a PWM update
+    if binary:
+        return reply_opcode(OP_UPDATED)
+    return reply_equals(UPDATE_REPLY)
+
+##### Tk helpers #####
+def tk_when_done(widget, future, callback, poll_ms=10):
+    #Calls callback(future) on the Tk thread once the future completes, without blocking mainloop
+    def poll():
+        if future.done():
+            callback(future)
+        else:
+            widget.after(poll_ms, poll)
+    widget.after(0, poll)
@@ -0,0 +1,78 @@
+#############################################################
+#                   PWM UI Update Queue                     #
+#############################################################
+#region
+# Description: the only way for worker threads (and the
+# transport loop) to change what is on screen. Workers post
+# state changes into the queue, the Tk thread drains it with
+# after() and applies every pending change in one batch
+# followed by a single repaint.
+#
+# Date modified: 18/10/2026
+#
+# Notes:
+#   -   Tk is not thread-safe. Setting a StringVar/IntVar or
+#       calling after() from another thread can hang the UI,
+#       so workers must only ever call post()/post_set().
+#   -   Updates are keyed. A newer update with the same key
+#       replaces the pending one, so a burst of changes to
+#       the same label or channel is applied once.
+#   -   start() must be called from the Tk thread.
+#
+#############################################################
+#endregion
+
+import logging
+import threading
+from PWM_Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_MS = 20 # How often the Tk thread checks for new updates
+
+# Metrics (see PWM_Metrics)
+QUEUE_DEPTH     = metrics.gauge("pwm_ui_queue_depth", "UI updates waiting for the Tk thread")
+UPDATES_APPLIED = metrics.counter("pwm_ui_queue_applied_total", "UI updates applied by the Tk thread")
+REPAINTS        = metrics.counter("pwm_ui_queue_repaints_total", "Batched repaints")
+
+class ui_update_queue:
+    def __init__(self, widget, poll_ms=DEFAULT_POLL_MS):
+        self.widget = widget # Any Tk widget, only used for after() and the repaint
+        self.poll_ms = poll_ms
+        self._lock = threading.Lock()
+        self._updates = {} # key -> (function, args), newest per key, applied in the order keys were first posted
+        self._after_id = None
+
+    def post(self, key, function, *args):
+        #Thread-safe. function(*args) is called on the Tk thread during the next drain.
+        with self._lock:
+            self._updates[key] = (function, args)
+            QUEUE_DEPTH.set(len(self._updates))
+
+    def post_set(self, variable, value):
+        #Thread-safe shortcut for setting a Tk variable, keyed on its Tcl name (tkinter variables are unhashable)
+        self.post(("variable", str(variable)), variable.set, value)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.poll_ms, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        with self._lock:
+            updates, self._updates = self._updates, {}
+            QUEUE_DEPTH.set(0)
+        for function, args in updates.values():
+            try:
+                function(*args)
+            except Exception:
+                logger.exception("Error applying UI update %s", function.__name__)
+        if len(updates) > 0:
+            UPDATES_APPLIED.inc(len(updates))
+            REPAINTS.inc()
+            self.widget.update_idletasks() # One repaint for the whole batch
+        self._after_id = self.widget.after(self.poll_ms, self._drain)